@@ -2,6 +2,10 @@
 """Create CONTAINS edges between Modules and their Entities."""
 
 import psycopg2
+from psycopg2 import sql
+
+GRAPH_NAME = "regen_graph"
+
 
 def main():
     conn = psycopg2.connect("postgresql://darrenzal@localhost:5432/eliza")
@@ -14,27 +18,81 @@ def main():
 
     print("Creating CONTAINS edges between Modules and Entities...")
 
-    total_edges = 0
+    # Only labels that exist in the graph have a backing table
+    cursor.execute("""
+        SELECT l.name FROM ag_catalog.ag_label l
+        JOIN ag_catalog.ag_graph g ON l.graph = g.graphid
+        WHERE g.name = %s AND l.kind = 'v' AND l.name = ANY(%s)
+    """, (GRAPH_NAME, labels))
+    existing = {row[0] for row in cursor.fetchall()}
+    labels = [label for label in labels if label in existing]
+
+    cursor.execute("""
+        SELECT 1 FROM ag_catalog.ag_label l
+        JOIN ag_catalog.ag_graph g ON l.graph = g.graphid
+        WHERE g.name = %s AND l.name = 'CONTAINS'
+    """, (GRAPH_NAME,))
+    if cursor.fetchone() is None:
+        cursor.execute("SELECT create_elabel(%s, 'CONTAINS');", (GRAPH_NAME,))
+
+    # Index each entity table on (repo, file_path) so the prefix match below
+    # becomes a btree range scan per module instead of a scan per module
     for label in labels:
-        # Create CONTAINS edges for this entity type
-        query = f"""
-            SELECT * FROM cypher('regen_graph', $$
-                MATCH (m:Module), (e:{label})
-                WHERE e.repo = m.repo AND e.file_path STARTS WITH m.path
-                MERGE (m)-[:CONTAINS]->(e)
-                RETURN count(*) as cnt
-            $$) as (cnt agtype);
-        """
-        try:
+        cursor.execute(sql.SQL("""
+            CREATE INDEX IF NOT EXISTS {index} ON {table}
+            ((properties ->> 'repo'), (properties ->> 'file_path') text_pattern_ops);
+        """).format(
+            index=sql.Identifier(f"{label.lower()}_repo_file_path_idx"),
+            table=sql.Identifier(GRAPH_NAME, label)
+        ))
+        cursor.execute(sql.SQL("ANALYZE {table};").format(table=sql.Identifier(GRAPH_NAME, label)))
+    conn.commit()
+
+    # One join over AGE's label tables instead of a Cypher cross-product per
+    # label; NOT EXISTS keeps the MERGE semantics for edges already present
+    entities = sql.SQL(" UNION ALL ").join(
+        sql.SQL("SELECT {label} AS label, id, properties FROM {table}").format(
+            label=sql.Literal(label),
+            table=sql.Identifier(GRAPH_NAME, label)
+        )
+        for label in labels
+    )
+    query = sql.SQL("""
+        WITH pairs AS (
+            SELECT m.id AS start_id, e.id AS end_id, e.label
+            FROM {modules} m
+            JOIN ({entities}) e
+              ON e.properties ->> 'repo' = m.properties ->> 'repo'
+             AND starts_with(e.properties ->> 'file_path', m.properties ->> 'path')
+             -- Same prefix test as a range the text_pattern_ops index can serve
+             AND (e.properties ->> 'file_path') ~>=~ (m.properties ->> 'path')
+             AND (e.properties ->> 'file_path') ~<~ ((m.properties ->> 'path') || chr(1114111))
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {contains} c
+                WHERE c.start_id = m.id AND c.end_id = e.id
+            )
+        ), inserted AS (
+            INSERT INTO {contains} (start_id, end_id)
+            SELECT start_id, end_id FROM pairs
+        )
+        SELECT label, count(*) FROM pairs GROUP BY label ORDER BY label;
+    """).format(
+        modules=sql.Identifier(GRAPH_NAME, "Module"),
+        entities=entities,
+        contains=sql.Identifier(GRAPH_NAME, "CONTAINS")
+    )
+
+    total_edges = 0
+    try:
+        if labels:
             cursor.execute(query)
-            result = cursor.fetchone()
-            count = int(str(result[0]))
-            print(f"  {label}: {count} edges")
-            total_edges += count
-            conn.commit()
-        except Exception as e:
-            print(f"  {label}: Error - {e}")
-            conn.rollback()
+            for label, count in cursor.fetchall():
+                print(f"  {label}: {count} edges")
+                total_edges += count
+        conn.commit()
+    except Exception as e:
+        print(f"  Error - {e}")
+        conn.rollback()
 
     print(f"\nTotal CONTAINS edges created: {total_edges}")
 
@@ -4,17 +4,22 @@ Create MENTIONS edges by scanning documentation and linking to code entities in
 This script:
 1. Queries existing documents from KOI database
 2. Loads entities from extracted_entities.json
-3. For each document, extracts entity mentions using entity_linker
-4. Creates Document nodes in the graph
-5. Creates MENTIONS edges connecting docs to Keepers/Msgs
+3. For each document, extracts entity mentions using entity_linker (in worker processes),
+   reusing mentions cached for unchanged content in mention_cache
+4. Creates Document nodes in the graph (batched with UNWIND)
+5. Creates MENTIONS edges connecting docs to Keepers/Msgs (batched with UNWIND)
 """
 
+import hashlib
 import json
+import os
+from dataclasses import asdict
+from multiprocessing import Pool
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import age
-from entity_linker import Entity, extract_entity_mentions
-from typing import List, Dict, Any
+from entity_linker import LINKER_VERSION, Entity, Mention, extract_entity_mentions
+from typing import Any, Dict, Iterator, List
 
 
 def load_entities_from_json(json_path: str) -> List[Entity]:
@@ -31,16 +36,18 @@ def load_entities_from_json(json_path: str) -> List[Entity]:
         data = json.load(f)
 
     entities = []
-    for item in data:
+    for item in data['keepers'] + data['msgs']:
         entity_type = item['entity_type']
         name = item['name']
 
-        # Extract module from file_path (e.g., x/ecocredit/basket/... -> basket)
+        # Extract module from file_path (e.g., x/ecocredit/basket/... -> basket).
+        # MENTIONS edges match on it, so it must agree with the graph's module
+        # property: a directory under x/ecocredit, otherwise 'unknown'
         file_path = item.get('file_path', '')
         module = 'unknown'
         if 'x/ecocredit/' in file_path:
             parts = file_path.split('x/ecocredit/')[1].split('/')
-            if len(parts) > 0:
+            if len(parts) > 1:
                 module = parts[0]
 
         # Create entity_id
@@ -62,99 +69,246 @@ def load_entities_from_json(json_path: str) -> List[Entity]:
     return entities
 
 
-def get_koi_documents(conn, limit: int = 100) -> List[Dict[str, Any]]:
+def get_koi_documents(conn, version: str, limit: int = 100, itersize: int = 200) -> Iterator[Dict[str, Any]]:
     """
-    Query existing documents from KOI database.
+    Stream existing documents from KOI database.
+
+    Uses a named (server-side) cursor so rows are fetched in batches of
+    itersize instead of loading every document's content into memory.
+    Each row carries the SHA-256 of its content and, when mention_cache
+    holds an entry for that hash and entity version, the cached mentions.
+
+    The rows are pulled from the extraction pool's feeder thread, so conn
+    must be a connection of its own, never the one the graph writes use.
 
     Args:
-        conn: psycopg2 connection to KOI database
+        conn: psycopg2 connection to KOI database, used only for this read
+        version: Entity set version from entities_version()
         limit: Maximum number of documents to retrieve
+        itersize: Number of rows fetched per round-trip
 
-    Returns:
-        List of document dictionaries with id, content, and file_path
+    Yields:
+        Document dictionaries with id, content, file_path, title,
+        content_hash and cached_mentions (None on a cache miss)
     """
-    with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+    with conn.cursor(name='koi_documents', cursor_factory=RealDictCursor) as cursor:
+        cursor.itersize = itersize
         cursor.execute("""
             SELECT
-                id,
-                content->>'text' as content,
-                metadata->>'source_url' as file_path,
-                metadata->>'original_id' as title
-            FROM koi_memories
-            WHERE metadata->>'source_url' LIKE '%%regen-ledger%%'
+                m.id,
+                m.content->>'text' as content,
+                m.metadata->>'source_url' as file_path,
+                m.metadata->>'original_id' as title,
+                h.content_hash,
+                c.mentions as cached_mentions
+            FROM koi_memories m
+            CROSS JOIN LATERAL (
+                SELECT sha256(convert_to(m.content->>'text', 'UTF8')) as content_hash
+            ) h
+            LEFT JOIN public.mention_cache c
+                ON c.content_hash = h.content_hash AND c.entities_version = %s
+            WHERE m.metadata->>'source_url' LIKE '%%regen-ledger%%'
             LIMIT %s
-        """, (limit,))
+        """, (version, limit))
 
-        documents = cursor.fetchall()
-        return [dict(doc) for doc in documents]
+        yield from cursor
 
 
-def create_document_node(conn, doc_id: str, file_path: str, title: str = None):
+def entities_version(entities: List[Entity], config: Dict[str, Any]) -> str:
     """
-    Create a Document node in the graph if it doesn't already exist.
+    Fingerprint the entity set and linker so cached mentions are reused only
+    when the entities they were extracted against, the linker code
+    (LINKER_VERSION) and its settings are all unchanged.
 
     Args:
-        conn: psycopg2 connection with AGE extension loaded
-        doc_id: Document ID
-        file_path: Path to the document file
-        title: Optional title for the document
+        entities: Entities documents are scanned for
+        config: Settings passed to extract_entity_mentions
+
+    Returns:
+        Hex SHA-256 of the linker version, settings and entities' matchable fields
+    """
+    signature = {
+        'linker_version': LINKER_VERSION,
+        'config': config,
+        'entities': [[e.entity_id, e.entity_type, e.name, e.module, e.aliases] for e in entities],
+    }
+    return hashlib.sha256(json.dumps(signature, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def ensure_mention_cache(conn):
+    """
+    Create the mention cache table if it doesn't exist.
+
+    Args:
+        conn: psycopg2 connection to KOI database
     """
     with conn.cursor() as cursor:
-        cursor.execute("SET search_path = ag_catalog, public;")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS public.mention_cache (
+                content_hash bytea PRIMARY KEY,
+                entities_version text NOT NULL,
+                mentions jsonb NOT NULL
+            );
+        """)
 
-        # Use MERGE to avoid duplicates
-        # Use format() to inject variables directly into the Cypher query
-        query = """
-        SELECT * FROM cypher('regen_graph', $$
-            MERGE (d:Document {{id: '{doc_id}', file_path: '{file_path}', title: '{title}'}})
-            RETURN d
-        $$) as (result agtype);
-        """.format(
-            doc_id=doc_id.replace("'", "''"),
-            file_path=(file_path or 'unknown').replace("'", "''"),
-            title=(title or file_path or 'unknown').replace("'", "''")
-        )
 
-        cursor.execute(query)
+def write_mention_cache(conn, version: str, entries: Dict[bytes, List[Mention]]):
+    """
+    Store freshly extracted mentions keyed by document content hash.
+
+    Args:
+        conn: psycopg2 connection to KOI database
+        version: Entity set version from entities_version()
+        entries: Mentions per content hash
+    """
+    if not entries:
+        return
+
+    rows = [
+        (psycopg2.Binary(content_hash), version, json.dumps([asdict(m) for m in mentions]))
+        for content_hash, mentions in entries.items()
+    ]
+
+    with conn.cursor() as cursor:
+        execute_values(cursor, """
+            INSERT INTO public.mention_cache (content_hash, entities_version, mentions)
+            VALUES %s
+            ON CONFLICT (content_hash) DO UPDATE
+            SET entities_version = EXCLUDED.entities_version, mentions = EXCLUDED.mentions
+        """, rows)
 
 
-def create_mentions_edge(conn, doc_id: str, entity_name: str, surface_form: str,
-                         confidence: float, start_offset: int):
+def prepare_statements(conn):
     """
-    Create a MENTIONS edge from a Document to an entity (Keeper or Msg).
+    Prepare the parameterized Cypher statements used to write the graph.
+
+    AGE only accepts Cypher parameters through a prepared statement, so the
+    UNWIND writes are prepared once per session and executed with an agtype
+    map of rows. PostgreSQL parses and plans each statement once, and values
+    never need escaping into the query text.
 
     Args:
         conn: psycopg2 connection with AGE extension loaded
-        doc_id: Document ID
-        entity_name: Name of the entity being mentioned
-        surface_form: Exact text that matched
-        confidence: Confidence score (0.0-1.0)
-        start_offset: Character position in document
     """
     with conn.cursor() as cursor:
         cursor.execute("SET search_path = ag_catalog, public;")
 
-        # Find the entity by name (could be Keeper or Msg)
-        # Use format() to inject variables directly into the Cypher query
-        query = """
+        # Use MERGE to avoid duplicates
+        cursor.execute("""
+        PREPARE create_documents(agtype) AS
         SELECT * FROM cypher('regen_graph', $$
-            MATCH (d:Document {{id: '{doc_id}'}})
-            MATCH (e {{name: '{entity_name}'}})
-            MERGE (d)-[r:MENTIONS {{surface_form: '{surface_form}', confidence: {confidence}, start_offset: {start_offset}}}]->(e)
-            RETURN r
-        $$) as (result agtype);
-        """.format(
-            doc_id=doc_id.replace("'", "''"),
-            entity_name=entity_name.replace("'", "''"),
-            surface_form=surface_form.replace("'", "''"),
-            confidence=confidence,
-            start_offset=start_offset
-        )
+            UNWIND $rows AS r
+            MERGE (d:Document {id: r.doc_id, file_path: r.file_path, title: r.title})
+            RETURN count(d)
+        $$, $1) as (result agtype);
+        """)
+
+        # Find each entity by name and module (could be Keeper or Msg); the
+        # name alone is shared, e.g. every Keeper is named "Keeper"
+        cursor.execute("""
+        PREPARE create_mentions(agtype) AS
+        SELECT * FROM cypher('regen_graph', $$
+            UNWIND $rows AS r
+            MATCH (d:Document {id: r.doc_id})
+            MATCH (e {name: r.entity_name, module: r.module})
+            MERGE (d)-[m:MENTIONS {surface_form: r.surface_form, start_offset: r.start_offset}]->(e)
+            SET m.confidence = r.confidence
+            RETURN count(m)
+        $$, $1) as (result agtype);
+        """)
 
+
+def create_document_nodes(conn, documents: List[Dict[str, Any]]):
+    """
+    Create Document nodes in the graph with a single UNWIND statement.
+
+    Args:
+        conn: psycopg2 connection prepared with prepare_statements()
+        documents: List of dicts with doc_id, file_path and title
+    """
+    if not documents:
+        return
+
+    rows = [{
+        'doc_id': doc['doc_id'],
+        'file_path': doc['file_path'] or 'unknown',
+        'title': doc['title'] or doc['file_path'] or 'unknown'
+    } for doc in documents]
+
+    with conn.cursor() as cursor:
+        cursor.execute("EXECUTE create_documents(%s);", (json.dumps({'rows': rows}),))
+
+
+def create_mentions_edges(conn, mentions: List[Dict[str, Any]]):
+    """
+    Create MENTIONS edges from Documents to entities (Keeper or Msg) in one batch.
+
+    Args:
+        conn: psycopg2 connection prepared with prepare_statements()
+        mentions: List of dicts with doc_id, entity_name, module,
+            surface_form, confidence and start_offset
+    """
+    if not mentions:
+        return
+
+    with conn.cursor() as cursor:
+        # A failed batch must not abort the Document writes in this transaction
+        cursor.execute("SAVEPOINT mentions_batch;")
         try:
-            cursor.execute(query)
+            cursor.execute("EXECUTE create_mentions(%s);", (json.dumps({'rows': mentions}),))
         except Exception as e:
-            print(f"Warning: Could not create MENTIONS edge for {entity_name}: {e}")
+            print(f"Warning: Could not create batch of {len(mentions)} MENTIONS edges: {e}")
+            cursor.execute("ROLLBACK TO SAVEPOINT mentions_batch;")
+        cursor.execute("RELEASE SAVEPOINT mentions_batch;")
+
+
+def flush_batch(conn, documents: List[Dict[str, Any]], mentions: List[Dict[str, Any]],
+                version: str, cache_entries: Dict[bytes, List[Mention]]):
+    """
+    Write pending Document nodes, then the MENTIONS edges that point from them,
+    plus new mention cache entries, and commit them as one transaction.
+
+    All pending collections are cleared in place once written.
+    """
+    create_document_nodes(conn, documents)
+    create_mentions_edges(conn, mentions)
+    write_mention_cache(conn, version, cache_entries)
+    conn.commit()
+    documents.clear()
+    mentions.clear()
+    cache_entries.clear()
+
+
+# Entities and linker settings for the extraction workers, set once per
+# process by _init_worker
+_worker_entities: List[Entity] = []
+_worker_config: Dict[str, Any] = {}
+
+
+def _init_worker(entities: List[Entity], config: Dict[str, Any]):
+    """Pool initializer: keep the entity list and linker settings in worker state."""
+    global _worker_entities, _worker_config
+    _worker_entities = entities
+    _worker_config = config
+
+
+def _extract_document(job):
+    """
+    Extract mentions for one document inside a worker process.
+
+    Documents with cached mentions are not scanned again.
+
+    Args:
+        job: (doc_id, file_path, title, content, content_hash, cached_mentions) tuple
+
+    Returns:
+        (doc_id, file_path, title, content_hash, mentions, from_cache) tuple
+    """
+    doc_id, file_path, title, content, content_hash, cached_mentions = job
+    if cached_mentions is not None:
+        return doc_id, file_path, title, content_hash, [Mention(**m) for m in cached_mentions], True
+    mentions = extract_entity_mentions(content, _worker_entities, _worker_config)
+    return doc_id, file_path, title, content_hash, mentions, False
 
 
 def main():
@@ -167,6 +321,11 @@ def main():
     GRAPH_NAME = "regen_graph"
     ENTITIES_JSON = "../../data/extracted_entities.json"
     DOC_LIMIT = 10000  # Process all documents (current total: 5,875)
+    MENTION_BATCH_SIZE = 1000  # MENTIONS edges written per UNWIND statement
+    DOC_BATCH_SIZE = 1000  # Documents written per transaction at most
+    WORKERS = os.cpu_count() or 1  # Processes running entity extraction
+    EXTRACT_CHUNKSIZE = 16  # Documents handed to a worker at a time
+    LINKER_CONFIG = {'min_confidence': 0.0, 'disambiguate': True}  # extract_entity_mentions settings
 
     print("=" * 80)
     print("MENTIONS Edge Creation Script")
@@ -183,24 +342,36 @@ def main():
 
     # Connect to database
     print(f"\n2. Connecting to PostgreSQL database '{DB_NAME}'...")
-    conn = psycopg2.connect(
+    conn_params = dict(
         host=DB_HOST,
         port=DB_PORT,
         database=DB_NAME,
         user="darrenzal"  # Changed to match system user
     )
-    conn.autocommit = True
+    conn = psycopg2.connect(**conn_params)
+    # Commit once per batch rather than per statement. The graph is rebuilt
+    # from source documents, so losing the last commits on a crash is fine
+    conn.autocommit = False
+    with conn.cursor() as cursor:
+        cursor.execute("SET synchronous_commit = off;")
+    ensure_mention_cache(conn)
 
     # Load AGE extension
     print("   Loading AGE extension...")
     with conn.cursor() as cursor:
         cursor.execute("LOAD 'age';")
         cursor.execute("SET search_path = ag_catalog, public;")
+    prepare_statements(conn)
+    conn.commit()
 
     # Get documents from KOI
-    print(f"\n3. Querying documents from koi_memories table (limit {DOC_LIMIT})...")
-    documents = get_koi_documents(conn, limit=DOC_LIMIT)
-    print(f"   Retrieved {len(documents)} documents")
+    print(f"\n3. Streaming documents from koi_memories table (limit {DOC_LIMIT})...")
+    version = entities_version(entities, LINKER_CONFIG)
+    # The pool's feeder thread reads documents while this thread writes the
+    # graph, and a psycopg2 connection can't serve both at once (nor fetch
+    # while a failed batch has aborted the write transaction)
+    read_conn = psycopg2.connect(**conn_params)
+    documents = get_koi_documents(read_conn, version, limit=DOC_LIMIT)
 
     # Process each document
     print(f"\n4. Processing documents and creating graph nodes/edges...")
@@ -208,58 +379,80 @@ def main():
     total_mentions = 0
     doc_count = 0
     mention_details = []  # Store details for report
+    cache_hits = 0
+    pending_docs = []
+    pending_mentions = []
+    pending_cache = {}  # content_hash -> mentions extracted this run
+
+    # Extraction is pure CPU work, so it runs in worker processes; this
+    # process stays the only writer to the graph
+    jobs = (
+        (
+            str(doc['id']),
+            doc.get('file_path', 'unknown'),
+            doc.get('title', None),
+            doc['content'] if doc['cached_mentions'] is None else None,
+            bytes(doc['content_hash']),
+            doc['cached_mentions']
+        )
+        for doc in documents
+        if doc.get('content')
+    )
 
-    for doc in documents:
-        doc_id = str(doc['id'])
-        content = doc.get('content', '')
-        file_path = doc.get('file_path', 'unknown')
-        title = doc.get('title', None)
-
-        if not content:
-            continue
-
-        # Create Document node
-        create_document_node(conn, doc_id, file_path, title)
-        doc_count += 1
-
-        # Extract mentions
-        mentions = extract_entity_mentions(content, entities)
-
-        if mentions:
-            print(f"\n   Document {doc_id} ({file_path}):")
-            print(f"   Found {len(mentions)} mentions")
-
-            # Create MENTIONS edges
-            for mention in mentions:
-                create_mentions_edge(
-                    conn,
-                    doc_id,
-                    mention.entity_name,
-                    mention.surface_form,
-                    mention.confidence,
-                    mention.start_offset
-                )
-
-                total_mentions += 1
-
-                # Store for report
-                mention_details.append({
-                    'doc_id': doc_id,
-                    'file_path': file_path,
-                    'entity_name': mention.entity_name,
-                    'entity_type': mention.entity_type,
-                    'surface_form': mention.surface_form,
-                    'confidence': mention.confidence,
-                    'context': mention.context
-                })
-
-                print(f"     - {mention.entity_name} ({mention.entity_type}): '{mention.surface_form}' [conf: {mention.confidence:.2f}]")
+    with Pool(WORKERS, initializer=_init_worker, initargs=(entities, LINKER_CONFIG)) as pool:
+        results = pool.imap_unordered(_extract_document, jobs, chunksize=EXTRACT_CHUNKSIZE)
+        for doc_id, file_path, title, content_hash, mentions, from_cache in results:
+            # Queue Document node
+            pending_docs.append({'doc_id': doc_id, 'file_path': file_path, 'title': title})
+            doc_count += 1
+
+            if from_cache:
+                cache_hits += 1
+            else:
+                pending_cache[content_hash] = mentions
+
+            if mentions:
+                print(f"\n   Document {doc_id} ({file_path}):")
+                print(f"   Found {len(mentions)} mentions")
+
+                # Queue MENTIONS edges
+                for mention in mentions:
+                    pending_mentions.append({
+                        'doc_id': doc_id,
+                        'entity_name': mention.entity_name,
+                        'module': mention.entity_module,
+                        'surface_form': mention.surface_form,
+                        'confidence': mention.confidence,
+                        'start_offset': mention.start_offset
+                    })
+
+                    total_mentions += 1
+
+                    # Store for report
+                    mention_details.append({
+                        'doc_id': doc_id,
+                        'file_path': file_path,
+                        'entity_name': mention.entity_name,
+                        'entity_type': mention.entity_type,
+                        'module': mention.entity_module,
+                        'surface_form': mention.surface_form,
+                        'confidence': mention.confidence,
+                        'context': mention.context
+                    })
+
+                    print(f"     - {mention.entity_name} ({mention.entity_type}): '{mention.surface_form}' [conf: {mention.confidence:.2f}]")
+
+            if len(pending_mentions) >= MENTION_BATCH_SIZE or len(pending_docs) >= DOC_BATCH_SIZE:
+                flush_batch(conn, pending_docs, pending_mentions, version, pending_cache)
+
+    flush_batch(conn, pending_docs, pending_mentions, version, pending_cache)
 
     # Summary
     print("\n" + "=" * 80)
     print("SUMMARY")
     print("=" * 80)
     print(f"Documents processed: {doc_count}")
+    print(f"Documents served from mention cache: {cache_hits}")
     print(f"Total MENTIONS edges created: {total_mentions}")
     print(f"Average mentions per document: {total_mentions/doc_count:.2f}" if doc_count > 0 else "N/A")
 
@@ -278,7 +471,8 @@ def main():
 
     print(f"\nResults saved to mention_results.json")
 
-    # Close connection
+    # Close connections
+    read_conn.close()
     conn.close()
     print("\nDone!")
 
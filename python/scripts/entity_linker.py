@@ -6,13 +6,40 @@ in documentation text and return structured mention objects with context and con
 """
 
 import re
+from bisect import bisect_left, bisect_right
 from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# Surface-form scans use the third-party regex module when it is installed;
+# it has the same syntax and Unicode word boundaries, so fall back to re
+try:
+    import regex as _surface_engine
+    REGEX_MODULE_AVAILABLE = True
+except ImportError:
+    _surface_engine = re
+    REGEX_MODULE_AVAILABLE = False
+
+_BACKTICK_RE = re.compile('`')
+_WORD_RE = re.compile(r'\w+')
+
+# Bump whenever a change to matching can change the mentions found, so
+# results cached against an older linker are not reused
+LINKER_VERSION = 2
+
+# Characters on each side of a match used to choose between same-named entities
+CONTEXT_WINDOW = 100
+
+# Compiled matchers keyed by entity list contents (see _get_matcher)
+_MATCHER_CACHE = {}
+_MATCHER_CACHE_SIZE = 8
 
 
 @dataclass
 class Entity:
     """An entity from the graph (Keeper or Msg)"""
+    __slots__ = ('entity_id', 'entity_type', 'name', 'module', 'aliases')
+
     entity_id: str          # Unique ID (e.g., "keeper:basket" or "msg:MsgCreateBatch")
     entity_type: str        # "Keeper" or "Msg"
     name: str               # e.g., "MsgCreateBatch", "Keeper"
@@ -23,9 +50,13 @@ class Entity:
 @dataclass
 class Mention:
     """A mention of an entity found in document text"""
+    __slots__ = ('entity_id', 'entity_name', 'entity_type', 'entity_module', 'surface_form',
+                 'start_offset', 'end_offset', 'confidence', 'context')
+
     entity_id: str          # Which entity was mentioned
     entity_name: str        # Name of the entity
     entity_type: str        # "Keeper" or "Msg"
+    entity_module: str      # Module of the entity, tells same-named entities apart
     surface_form: str       # Exact text that matched (may differ from name)
     start_offset: int       # Character position in doc (start)
     end_offset: int         # Character position in doc (end)
@@ -88,76 +119,219 @@ def _extract_context(doc_text: str, start: int, end: int, context_chars: int = 5
     return context
 
 
-def _is_in_code_block(doc_text: str, position: int) -> bool:
+def _backtick_offsets(doc_text: str) -> List[int]:
     """
-    Check if a position in the text is within markdown code formatting.
+    Collect the positions of every backtick in the text, in order.
+
+    Built once per document so code-block checks don't rescan the text.
 
     Args:
         doc_text: Full document text
+
+    Returns:
+        Sorted list of backtick offsets
+    """
+    return [match.start() for match in _BACKTICK_RE.finditer(doc_text)]
+
+
+def _is_in_code_block(backticks: List[int], position: int) -> bool:
+    """
+    Check if a position in the text is within markdown code formatting.
+
+    Args:
+        backticks: Backtick offsets from _backtick_offsets()
         position: Position to check
 
     Returns:
         True if position is within backticks
     """
-    # Look backwards and forwards for backticks
-    before = doc_text[:position]
-    after = doc_text[position:]
-
     # Count backticks before this position
-    backtick_count = before.count('`')
+    backtick_count = bisect_left(backticks, position)
 
     # If odd number of backticks before, we're inside a code block
     # Check if there's a closing backtick after
-    if backtick_count % 2 == 1 and '`' in after:
-        return True
+    return backtick_count % 2 == 1 and backtick_count < len(backticks)
+
+
+# Kinds of surface pattern an entity can be matched by
+KIND_MODULE = 'module'      # "{module} keeper" for Keeper entities
+KIND_ALIAS = 'alias'        # entity.aliases, case-insensitive
+KIND_NAME = 'name'          # entity.name, exact or case-insensitive
 
-    return False
 
+def _normalize(text: str) -> str:
+    """Lowercase and collapse whitespace so a match can be looked up by its text."""
+    return ' '.join(text.lower().split())
 
-def _find_entity_patterns(entity: Entity) -> List[Tuple[str, float]]:
+
+def _find_entity_patterns(entity: Entity) -> List[Tuple[str, str, str, int, Any]]:
     """
-    Generate regex patterns for an entity with confidence weights.
+    Generate the surface patterns for an entity.
 
     Args:
         entity: The entity to create patterns for
 
     Returns:
-        List of (pattern, base_confidence) tuples
+        List of (regex_fragment, lookup_key, kind, order, verify) tuples, where
+        order ranks patterns of the same kind within the entity and verify is
+        what a case-insensitive hit must still satisfy (a compiled pattern
+        for module-keeper phrases, the lowercased alias for aliases)
     """
     patterns = []
 
-    # Main entity name - exact match with word boundaries
-    if len(entity.name) > 3:  # Avoid matching very short names
-        patterns.append((
-            r'\b' + re.escape(entity.name) + r'\b',
-            1.0
-        ))
-
-    # Case-insensitive variant
-    if len(entity.name) > 3:
-        patterns.append((
-            r'\b' + re.escape(entity.name) + r'\b',
-            0.9
-        ))
-
-    # For Keeper entities, match "{module} keeper" pattern
+    # For Keeper entities, match "{module} keeper" pattern (most specific)
     if entity.entity_type == "Keeper" and entity.module:
         patterns.append((
-            r'\b' + re.escape(entity.module) + r'\s+[Kk]eeper\b',
-            0.8
+            re.escape(entity.module) + r'\s+keeper',
+            _normalize(f"{entity.module} keeper"),
+            KIND_MODULE,
+            0,
+            # Module is case-sensitive, "keeper" may be capitalized
+            re.compile(re.escape(entity.module) + r'\s+[Kk]eeper')
         ))
 
-    # Add alias patterns
-    for alias in entity.aliases:
+    # Alias patterns
+    for i, alias in enumerate(entity.aliases):
         if len(alias) > 3:
-            patterns.append((
-                r'\b' + re.escape(alias) + r'\b',
-                0.8
-            ))
+            patterns.append((re.escape(alias), _normalize(alias), KIND_ALIAS, i + 1, alias.lower()))
+
+    # Main entity name - avoid matching very short names
+    if len(entity.name) > 3:
+        patterns.append((re.escape(entity.name), _normalize(entity.name), KIND_NAME, 0, None))
 
     return patterns
 
 
+@dataclass
+class _EntityMatcher:
+    """Surface patterns for one entity list, ready to scan documents with."""
+    lookup: Dict[str, list]         # normalized text -> [(entity_index, kind, order, verify)]
+    anchors: Dict[str, List[str]]   # first word of a surface form -> regex fragments
+    lengths: Dict[str, int]         # regex fragment -> surface length, to order the scans
+    context_terms: List[frozenset]  # per entity: words that point to it nearby (its module)
+
+    def patterns_for(self, doc_text: str) -> list:
+        """
+        Return patterns for only the surface forms that can occur in doc_text.
+
+        Any match contains its surface form's first word as a whole word, so
+        one cheap tokenization of the document rules out every surface form
+        whose anchor word is absent.
+
+        Returns:
+            One compiled pattern per remaining surface form, longest first
+        """
+        words = set(_WORD_RE.findall(doc_text.lower()))
+
+        fragments = set(self.anchors.get('', ()))
+        for word in self.anchors.keys() & words:
+            fragments.update(self.anchors[word])
+
+        return [
+            _compile_surface(fragment)
+            for fragment in sorted(fragments, key=lambda f: (-self.lengths[f], f))
+        ]
+
+
+@lru_cache(maxsize=4096)
+def _compile_surface(fragment: str):
+    """Compile one surface form as a case-insensitive, word-bounded pattern."""
+    return _surface_engine.compile(r'\b' + fragment + r'\b', _surface_engine.IGNORECASE)
+
+
+def _build_matcher(entity_list: List[Entity]) -> _EntityMatcher:
+    """
+    Build the matcher for every entity surface form.
+
+    Names, aliases and module-keeper phrases are indexed by their anchor
+    word and scanned one surface form at a time, so a form that shares a
+    prefix with (or overlaps) another is still found wherever it occurs.
+    Each match is dispatched through a lookup keyed by its normalized text.
+
+    Args:
+        entity_list: Known entities from the graph
+
+    Returns:
+        _EntityMatcher for the list
+    """
+    lookup = {}
+    anchors = {}
+    lengths = {}
+
+    for entity_index, entity in enumerate(entity_list):
+        for fragment, key, kind, order, verify in _find_entity_patterns(entity):
+            lookup.setdefault(key, []).append((entity_index, kind, order, verify))
+            if fragment not in lengths:
+                lengths[fragment] = len(key)
+                first_word = _WORD_RE.search(key)
+                anchors.setdefault(first_word.group() if first_word else '', []).append(fragment)
+
+    context_terms = [frozenset(_WORD_RE.findall(entity.module.lower())) for entity in entity_list]
+
+    return _EntityMatcher(lookup=lookup, anchors=anchors, lengths=lengths, context_terms=context_terms)
+
+
+def _pick_by_context(candidates: list, context_terms: List[frozenset], doc_text: str,
+                     start: int, end: int, window: int = CONTEXT_WINDOW) -> tuple:
+    """
+    Choose between entities that share a surface form using nearby text.
+
+    Several entities can match the same text (every Keeper is named "Keeper").
+    The candidate whose context terms (its module) occur closest to the match
+    wins; ties keep the original entity order.
+
+    Args:
+        candidates: Scan candidates (priority, start, end, entity_index, ...)
+        context_terms: Per-entity context terms from the matcher
+        doc_text: Full document text
+        start: Start position of the match
+        end: End position of the match
+        window: Number of characters to look at on each side
+
+    Returns:
+        The winning candidate
+    """
+    nearest = {}
+    for word_match in _WORD_RE.finditer(doc_text, max(0, start - window), end + window):
+        if word_match.start() >= end:
+            distance = word_match.start() - end
+        elif word_match.end() <= start:
+            distance = start - word_match.end()
+        else:
+            continue  # Part of the match itself
+        word = word_match.group().lower()
+        if distance < nearest.get(word, distance + 1):
+            nearest[word] = distance
+
+    def rank(candidate):
+        terms = context_terms[candidate[3]]
+        return (min((nearest[t] for t in terms if t in nearest), default=float('inf')), candidate[0])
+
+    return min(candidates, key=rank)
+
+
+def _get_matcher(entity_list: List[Entity]):
+    """
+    Return the compiled matcher for an entity list, building it only once.
+
+    Callers scan thousands of documents against the same entities, so the
+    matcher is cached by the entities' matchable fields rather than rebuilt
+    (and its patterns recompiled) for every document.
+    """
+    key = tuple(
+        (entity.entity_type, entity.name, entity.module, tuple(entity.aliases))
+        for entity in entity_list
+    )
+
+    matcher = _MATCHER_CACHE.get(key)
+    if matcher is None:
+        if len(_MATCHER_CACHE) >= _MATCHER_CACHE_SIZE:
+            _MATCHER_CACHE.clear()
+        matcher = _MATCHER_CACHE[key] = _build_matcher(entity_list)
+
+    return matcher
+
+
 def extract_entity_mentions(
     doc_text: str,
     entity_list: List[Entity],
@@ -169,7 +343,7 @@ def extract_entity_mentions(
     Args:
         doc_text: The markdown/text content to scan
         entity_list: Known entities from the graph
-        config: Optional settings (min_confidence, context_chars, etc.)
+        config: Optional settings (min_confidence, context_chars, disambiguate)
 
     Returns:
         List of mentions found, sorted by start_offset
@@ -179,148 +353,111 @@ def extract_entity_mentions(
 
     min_confidence = config.get('min_confidence', 0.0)
     context_chars = config.get('context_chars', 50)
+    disambiguate = config.get('disambiguate', True)
 
     mentions = []
 
-    # Track matched ranges to avoid overlapping duplicates
-    matched_ranges = []
-
-    def overlaps_existing(start, end):
-        """Check if a range overlaps with any existing matches"""
-        for existing_start, existing_end in matched_ranges:
-            # Check for any overlap
-            if not (end <= existing_start or start >= existing_end):
-                return True
-        return False
-
-    # PHASE 1: Match specific patterns (module patterns and aliases) for all entities
-    for entity in entity_list:
-        # For Keeper entities, match "{module} keeper" pattern FIRST (more specific)
-        if entity.entity_type == "Keeper" and entity.module:
-            pattern = r'\b' + re.escape(entity.module) + r'\s+[Kk]eeper\b'
-            for match in re.finditer(pattern, doc_text):
-                start = match.start()
-                end = match.end()
-
-                # Skip if this overlaps with an existing match
-                if overlaps_existing(start, end):
-                    continue
-
-                matched_text = match.group()
-                in_code = _is_in_code_block(doc_text, start)
-
-                confidence = 0.8  # Contextual match
-
-                if confidence >= min_confidence:
-                    mention = Mention(
-                        entity_id=entity.entity_id,
-                        entity_name=entity.name,
-                        entity_type=entity.entity_type,
-                        surface_form=matched_text,
-                        start_offset=start,
-                        end_offset=end,
-                        confidence=confidence,
-                        context=_extract_context(doc_text, start, end, context_chars)
-                    )
-                    mentions.append(mention)
-                    matched_ranges.append((start, end))
-
-        # Match aliases (also specific, so do in this phase)
-        for alias in entity.aliases:
-            if len(alias) > 3:
-                pattern = r'\b' + re.escape(alias) + r'\b'
-                for match in re.finditer(pattern, doc_text, re.IGNORECASE):
-                    start = match.start()
-                    end = match.end()
-
-                    # Skip if this overlaps with an existing match
-                    if overlaps_existing(start, end):
+    matcher = _get_matcher(entity_list)
+    patterns = matcher.patterns_for(doc_text)
+    if not patterns:
+        return mentions
+    lookup = matcher.lookup
+
+    backticks = _backtick_offsets(doc_text)
+
+    # Every surface form is scanned on its own, as the old per-entity passes
+    # did, so a longer form never hides a shorter or overlapping one. Each
+    # hit gets a priority key that reproduces the order those passes ran in:
+    #   phase 1 - "{module} keeper" and aliases (specific)
+    #   phase 2 - exact entity names (generic but high confidence)
+    #   phase 3 - case-insensitive entity names (lowest priority)
+    # then entity order and pattern order. Hits below min_confidence never
+    # block anything, and candidates sharing a span can only lose to the best
+    # of them, so each span keeps just its best passing candidate.
+    hits = []
+    dispatched = set()
+    for pattern in patterns:
+        for match in pattern.finditer(doc_text):
+            start, end = match.span()
+
+            # Forms with the same normalized text match the same spans, and
+            # a span's candidates depend only on its text
+            if (start, end) in dispatched:
+                continue
+            dispatched.add((start, end))
+
+            matched_text = match.group()
+            passing = []
+
+            for entity_index, kind, order, verify in lookup.get(_normalize(matched_text), ()):
+                entity = entity_list[entity_index]
+
+                if kind == KIND_MODULE:
+                    if not verify.fullmatch(matched_text):
                         continue
-
-                    matched_text = match.group()
-                    in_code = _is_in_code_block(doc_text, start)
-
+                    phase = 1
+                    confidence = 0.8  # Contextual match
+                elif kind == KIND_ALIAS:
+                    if matched_text.lower() != verify:
+                        continue
+                    phase = 1
                     confidence = 0.8  # Alias match
+                else:
+                    phase = 2 if matched_text == entity.name else 3
+                    in_code = _is_in_code_block(backticks, start)
+                    confidence = _calculate_confidence(entity.name, matched_text, in_code)
 
-                    if confidence >= min_confidence:
-                        mention = Mention(
-                            entity_id=entity.entity_id,
-                            entity_name=entity.name,
-                            entity_type=entity.entity_type,
-                            surface_form=matched_text,
-                            start_offset=start,
-                            end_offset=end,
-                            confidence=confidence,
-                            context=_extract_context(doc_text, start, end, context_chars)
-                        )
-                        mentions.append(mention)
-                        matched_ranges.append((start, end))
-
-    # PHASE 2: Match exact entity names (generic but high confidence)
-    for entity in entity_list:
-        if len(entity.name) > 3:  # Avoid very short names
-            pattern = r'\b' + re.escape(entity.name) + r'\b'
-            for match in re.finditer(pattern, doc_text):
-                start = match.start()
-                end = match.end()
-
-                # Skip if this overlaps with an existing match
-                if overlaps_existing(start, end):
+                if confidence < min_confidence:
                     continue
 
-                matched_text = match.group()
-                in_code = _is_in_code_block(doc_text, start)
-
-                confidence = _calculate_confidence(entity.name, matched_text, in_code)
-
-                if confidence >= min_confidence:
-                    mention = Mention(
-                        entity_id=entity.entity_id,
-                        entity_name=entity.name,
-                        entity_type=entity.entity_type,
-                        surface_form=matched_text,
-                        start_offset=start,
-                        end_offset=end,
-                        confidence=confidence,
-                        context=_extract_context(doc_text, start, end, context_chars)
-                    )
-                    mentions.append(mention)
-                    matched_ranges.append((start, end))
-
-    # PHASE 3: Match case-insensitive entity names (lowest priority)
-    for entity in entity_list:
-        if len(entity.name) > 3:
-            pattern = r'\b' + re.escape(entity.name) + r'\b'
-            for match in re.finditer(pattern, doc_text, re.IGNORECASE):
-                start = match.start()
-                end = match.end()
-
-                # Skip if this overlaps with an existing match
-                if overlaps_existing(start, end):
-                    continue
+                passing.append(((phase, entity_index, order), start, end, entity_index, matched_text, confidence))
 
-                matched_text = match.group()
+            if passing:
+                best = min(passing)
+                if disambiguate:
+                    # Different entities tied on phase: let the context decide
+                    rivals = [c for c in passing if c[0][0] == best[0][0] and c[3] != best[3]]
+                    if rivals:
+                        rivals.append(best)
+                        best = _pick_by_context(rivals, matcher.context_terms, doc_text, start, end)
+                hits.append(best)
 
-                # Skip if this is actually an exact match (already handled above)
-                if matched_text == entity.name:
-                    continue
+    hits.sort()
+
+    # Track matched ranges to avoid overlapping duplicates. Accepted ranges
+    # never overlap, so keeping them sorted by start also sorts them by end.
+    matched_starts = []
+    matched_ends = []
 
-                in_code = _is_in_code_block(doc_text, start)
-                confidence = _calculate_confidence(entity.name, matched_text, in_code)
-
-                if confidence >= min_confidence:
-                    mention = Mention(
-                        entity_id=entity.entity_id,
-                        entity_name=entity.name,
-                        entity_type=entity.entity_type,
-                        surface_form=matched_text,
-                        start_offset=start,
-                        end_offset=end,
-                        confidence=confidence,
-                        context=_extract_context(doc_text, start, end, context_chars)
-                    )
-                    mentions.append(mention)
-                    matched_ranges.append((start, end))
+    def overlaps_existing(start, end):
+        """Check if a range overlaps with any existing matches"""
+        # Only the neighbours on either side of start can overlap
+        i = bisect_right(matched_starts, start)
+        if i > 0 and matched_ends[i - 1] > start:
+            return True
+        return i < len(matched_starts) and matched_starts[i] < end
+
+    for _, start, end, entity_index, matched_text, confidence in hits:
+        # Skip if this overlaps with a higher-priority match
+        if overlaps_existing(start, end):
+            continue
+
+        i = bisect_right(matched_starts, start)
+        matched_starts.insert(i, start)
+        matched_ends.insert(i, end)
+
+        entity = entity_list[entity_index]
+        mentions.append(Mention(
+            entity_id=entity.entity_id,
+            entity_name=entity.name,
+            entity_type=entity.entity_type,
+            entity_module=entity.module,
+            surface_form=matched_text,
+            start_offset=start,
+            end_offset=end,
+            confidence=confidence,
+            context=_extract_context(doc_text, start, end, context_chars)
+        ))
 
     # Sort by start position
     mentions.sort(key=lambda m: m.start_offset)
@@ -332,71 +469,48 @@ def load_entities_from_graph(conn) -> List[Entity]:
     """
     Load all entities from regen_graph for matching.
 
+    Each row comes back as a single map cast to jsonb on the server, so
+    psycopg2 hands over a dict directly instead of four agtype values that
+    each need parsing.
+
     Args:
         conn: psycopg2 connection with AGE extension loaded
 
     Returns:
         List of Entity objects ready for matching
     """
-    import age
-
     entities = []
 
     with conn.cursor() as cursor:
         # Set search path
         cursor.execute("SET search_path = ag_catalog, public;")
 
-        # Load Keepers
-        keeper_query = """
-        SELECT * FROM cypher('regen_graph', $$
-            MATCH (k:Keeper)
-            RETURN k.entity_id, k.entity_type, k.name, k.module
-        $$) as (entity_id agtype, entity_type agtype, name agtype, module agtype);
-        """
-
-        cursor.execute(keeper_query)
-        for row in cursor.fetchall():
-            entity_id = age.loads(row[0])
-            entity_type = age.loads(row[1])
-            name = age.loads(row[2])
-            module = age.loads(row[3])
-
-            # Create aliases for Keeper entities
-            aliases = [f"{module} keeper", f"{module} Keeper"]
-
-            entities.append(Entity(
-                entity_id=entity_id,
-                entity_type=entity_type,
-                name=name,
-                module=module,
-                aliases=aliases
-            ))
-
-        # Load Msgs
-        msg_query = """
-        SELECT * FROM cypher('regen_graph', $$
-            MATCH (m:Msg)
-            RETURN m.entity_id, m.entity_type, m.name, m.module
-        $$) as (entity_id agtype, entity_type agtype, name agtype, module agtype);
-        """
-
-        cursor.execute(msg_query)
-        for row in cursor.fetchall():
-            entity_id = age.loads(row[0])
-            entity_type = age.loads(row[1])
-            name = age.loads(row[2])
-            module = age.loads(row[3])
-
-            # Msg entities don't need aliases by default
-            aliases = []
-
-            entities.append(Entity(
-                entity_id=entity_id,
-                entity_type=entity_type,
-                name=name,
-                module=module,
-                aliases=aliases
-            ))
+        # Keepers first, then Msgs
+        for label in ("Keeper", "Msg"):
+            query = """
+            SELECT props::text::jsonb FROM cypher('regen_graph', $$
+                MATCH (n:{label})
+                RETURN {{entity_id: n.entity_id, entity_type: n.entity_type, name: n.name, module: n.module}}
+            $$) as (props agtype);
+            """.format(label=label)
+
+            cursor.execute(query)
+            for (props,) in cursor.fetchall():
+                module = props['module']
+
+                # Create aliases for Keeper entities; Msg entities don't need them
+                if label == "Keeper":
+                    aliases = [f"{module} keeper", f"{module} Keeper"]
+                else:
+                    aliases = []
+
+                entities.append(Entity(
+                    entity_id=props['entity_id'],
+                    entity_type=props['entity_type'],
+                    name=props['name'],
+                    module=module,
+                    aliases=aliases
+                ))
 
     return entities
 
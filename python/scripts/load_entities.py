@@ -5,12 +5,46 @@ Loads Keepers and Msgs from extracted_entities.json into regen_graph
 Creates HANDLES relationships based on module extraction from file paths
 """
 
+import csv
+import functools
+import io
 import json
 import psycopg2
 import re
-from typing import Dict, List, Optional
+from collections import defaultdict
+from psycopg2 import sql
+from typing import Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
 
+# ijson streams entities one at a time instead of loading the whole file
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+# Entity labels loaded as nodes, mapped to their JSON array and stats key prefix
+ENTITY_LABELS = {'Keeper': 'keepers', 'Msg': 'msgs'}
+BATCH_SIZE = 500  # Rows per COPY and savepoint
+
+# Module directory and path suffix under x/ecocredit
+_MOD_RE = re.compile(r'/?x/ecocredit/([^/]+)/')
+_REL_RE = re.compile(r'(x/ecocredit/.*)')
+
+
+@functools.lru_cache(maxsize=4096)
+def _extract_module(file_path: str) -> str:
+    """Module name for a file path, cached since entities share files."""
+    match = _MOD_RE.search(file_path)
+    return match.group(1) if match else 'unknown'
+
+
+@functools.lru_cache(maxsize=4096)
+def _make_relative_path(file_path: str) -> str:
+    """Path from x/ecocredit/ onwards, cached since entities share files."""
+    match = _REL_RE.search(file_path)
+    return match.group(1) if match else file_path
+
 
 class AGEEntityLoader:
     """Loads entities into Apache AGE graph database"""
@@ -34,13 +68,14 @@ class AGEEntityLoader:
             'msgs_loaded': 0,
             'relationships_created': 0,
             'errors': [],
-            'module_counts': {}
+            'module_counts': defaultdict(lambda: {'keepers': 0, 'msgs': 0})
         }
 
     def connect(self):
         """Establish database connection and setup AGE"""
         try:
             self.conn = psycopg2.connect(self.db_connection_string)
+            self.conn.autocommit = False
             self.cursor = self.conn.cursor()
 
             # Load AGE extension
@@ -49,6 +84,11 @@ class AGEEntityLoader:
             # Set search path
             self.cursor.execute('SET search_path = ag_catalog, "$user", public;')
 
+            # The load is one transaction that can simply be re-run, so skip
+            # the synchronous WAL flush on commit. Remove for production loads
+            # that need the commit to be durable the moment it returns.
+            self.cursor.execute("SET synchronous_commit = off;")
+
             print("✓ Connected to database")
             print("✓ AGE extension loaded")
 
@@ -71,17 +111,7 @@ class AGEEntityLoader:
         Returns:
             Module name (basket, base, marketplace) or 'unknown'
         """
-        # Pattern to extract module from path
-        match = re.search(r'/x/ecocredit/([^/]+)/', file_path)
-        if match:
-            return match.group(1)
-
-        # Fallback: try without leading slash
-        match = re.search(r'x/ecocredit/([^/]+)/', file_path)
-        if match:
-            return match.group(1)
-
-        return 'unknown'
+        return _extract_module(file_path)
 
     def make_relative_path(self, file_path: str) -> str:
         """
@@ -93,11 +123,7 @@ class AGEEntityLoader:
         Returns:
             Relative path starting from x/ecocredit/
         """
-        # Find the position of 'x/ecocredit'
-        match = re.search(r'(x/ecocredit/.*)', file_path)
-        if match:
-            return match.group(1)
-        return file_path
+        return _make_relative_path(file_path)
 
     def clear_existing_data(self):
         """Clear all existing nodes and relationships from the graph"""
@@ -115,125 +141,113 @@ class AGEEntityLoader:
             print(f"✗ Error clearing data: {e}")
             self.stats['errors'].append(f"Clear data error: {e}")
 
-    def load_keeper(self, entity: Dict) -> bool:
+    def create_labels(self):
+        """Create the Keeper and Msg vertex labels so their tables exist for COPY"""
+        for label in ENTITY_LABELS:
+            self.cursor.execute("""
+            SELECT 1 FROM ag_catalog.ag_label l
+            JOIN ag_catalog.ag_graph g ON l.graph = g.graphid
+            WHERE g.name = %s AND l.name = %s;
+            """, (self.graph_name, label))
+            if self.cursor.fetchone() is None:
+                self.cursor.execute("SELECT create_vlabel(%s, %s);", (self.graph_name, label))
+
+    def entity_row(self, entity: Dict) -> Dict:
         """
-        Load a Keeper node into the graph
+        Build the node properties for a Keeper or Msg entity
 
         Args:
             entity: Entity dictionary from JSON
 
         Returns:
-            True if successful, False otherwise
+            agtype property map for the node
         """
-        try:
-            name = entity['name']
-            file_path = self.make_relative_path(entity['file_path'])
-            line_number = entity['line_number']
-            docstring = entity.get('docstring', '')
-            fields = entity.get('fields', [])
-            module = self.extract_module(entity['file_path'])
-
+        return {
+            'name': entity['name'],
+            'file_path': self.make_relative_path(entity['file_path']),
+            'line_number': entity['line_number'],
             # Convert None to empty string for docstring
-            if docstring is None:
-                docstring = ''
-
-            # Escape single quotes in strings for Cypher
-            name_escaped = name.replace("'", "\\'")
-            docstring_escaped = docstring.replace("'", "\\'")
-            file_path_escaped = file_path.replace("'", "\\'")
-
-            # Convert fields array to JSON string
-            import json
-            fields_json = json.dumps(fields)
-
-            query = f"""
-            SELECT * FROM cypher('{self.graph_name}', $$
-                CREATE (k:Keeper {{
-                    name: '{name_escaped}',
-                    file_path: '{file_path_escaped}',
-                    line_number: {line_number},
-                    docstring: '{docstring_escaped}',
-                    module: '{module}'
-                }})
-                RETURN k
-            $$) as (k agtype);
-            """
-
-            self.cursor.execute(query)
-            self.conn.commit()
-
-            self.stats['keepers_loaded'] += 1
-            self.stats['module_counts'][module] = self.stats['module_counts'].get(module, {'keepers': 0, 'msgs': 0})
-            self.stats['module_counts'][module]['keepers'] += 1
-
-            return True
-
-        except Exception as e:
-            error_msg = f"Error loading Keeper '{entity.get('name', 'unknown')}': {e}"
-            print(f"✗ {error_msg}")
-            self.stats['errors'].append(error_msg)
-            self.conn.rollback()
-            return False
+            'docstring': entity.get('docstring') or '',
+            'module': self.extract_module(entity['file_path']),
+            'fields': entity.get('fields') or []
+        }
 
-    def load_msg(self, entity: Dict) -> bool:
+    def _create_nodes(self, label: str, rows: List[Dict]) -> int:
         """
-        Load a Msg node into the graph
+        COPY nodes into the label table inside a savepoint, undoing only this
+        batch on failure
+
+        The label table's id column defaults to the next id from the label's
+        sequence, so only the agtype property maps are copied.
 
         Args:
-            entity: Entity dictionary from JSON
+            label: Entity label (Keeper or Msg)
+            rows: Property maps built by entity_row
 
         Returns:
-            True if successful, False otherwise
+            Number of nodes created
         """
-        try:
-            name = entity['name']
-            file_path = self.make_relative_path(entity['file_path'])
-            line_number = entity['line_number']
-            docstring = entity.get('docstring', '')
-            fields = entity.get('fields', [])
-            module = self.extract_module(entity['file_path'])
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow([json.dumps(row)])
+        buf.seek(0)
 
-            # Convert None to empty string for docstring
-            if docstring is None:
-                docstring = ''
+        copy = sql.SQL("COPY {table} (properties) FROM STDIN WITH (FORMAT csv)").format(
+            table=sql.Identifier(self.graph_name, label)
+        )
 
-            # Escape single quotes in strings for Cypher
-            name_escaped = name.replace("'", "\\'")
-            docstring_escaped = docstring.replace("'", "\\'")
-            file_path_escaped = file_path.replace("'", "\\'")
+        self.cursor.execute("SAVEPOINT batch;")
+        try:
+            self.cursor.copy_expert(copy, buf)
+        except Exception:
+            self.cursor.execute("ROLLBACK TO SAVEPOINT batch;")
+            raise
+        created = self.cursor.rowcount
+        self.cursor.execute("RELEASE SAVEPOINT batch;")
+        return created
 
-            # Convert fields array to JSON string
-            import json
-            fields_json = json.dumps(fields)
+    def _bulk_load(self, label: str, rows: List[Dict]) -> int:
+        """
+        Create a batch of nodes with a single COPY
 
-            query = f"""
-            SELECT * FROM cypher('{self.graph_name}', $$
-                CREATE (m:Msg {{
-                    name: '{name_escaped}',
-                    file_path: '{file_path_escaped}',
-                    line_number: {line_number},
-                    docstring: '{docstring_escaped}',
-                    module: '{module}'
-                }})
-                RETURN m
-            $$) as (m agtype);
-            """
+        The batch joins the load's open transaction. If it fails, its rows are
+        retried one at a time so only the bad rows are dropped and logged.
 
-            self.cursor.execute(query)
-            self.conn.commit()
+        Args:
+            label: Entity label (Keeper or Msg)
+            rows: Property maps built by entity_row
 
-            self.stats['msgs_loaded'] += 1
-            self.stats['module_counts'][module] = self.stats['module_counts'].get(module, {'keepers': 0, 'msgs': 0})
-            self.stats['module_counts'][module]['msgs'] += 1
+        Returns:
+            Number of nodes created
+        """
+        if not rows:
+            return 0
 
-            return True
+        try:
+            created = self._create_nodes(label, rows)
 
         except Exception as e:
-            error_msg = f"Error loading Msg '{entity.get('name', 'unknown')}': {e}"
-            print(f"✗ {error_msg}")
-            self.stats['errors'].append(error_msg)
-            self.conn.rollback()
-            return False
+            print(f"✗ Batch of {len(rows)} {label} nodes failed, retrying individually: {e}")
+            created = 0
+            loaded_rows = []
+            for row in rows:
+                try:
+                    created += self._create_nodes(label, [row])
+                    loaded_rows.append(row)
+                except Exception as e:
+                    error_msg = f"Error loading {label} '{row['name']}': {e}"
+                    print(f"✗ {error_msg}")
+                    self.stats['errors'].append(error_msg)
+            rows = loaded_rows
+
+        key = ENTITY_LABELS[label]
+        self.stats[f'{key}_loaded'] += created
+        module_counts = self.stats['module_counts']
+        for row in rows:
+            module_counts[row['module']][key] += 1
+
+        return created
 
     def create_handles_relationships(self):
         """
@@ -243,27 +257,38 @@ class AGEEntityLoader:
         print("\nCreating HANDLES relationships...")
 
         try:
-            # Get all modules
-            modules = list(self.stats['module_counts'].keys())
-
-            for module in modules:
-                if module == 'unknown':
-                    continue
-
-                query = f"""
-                SELECT * FROM cypher('{self.graph_name}', $$
-                    MATCH (k:Keeper {{module: '{module}'}})
-                    MATCH (m:Msg {{module: '{module}'}})
-                    CREATE (k)-[r:HANDLES]->(m)
-                    RETURN r
-                $$) as (r agtype);
-                """
-
-                self.cursor.execute(query)
-                results = self.cursor.fetchall()
-                count = len(results)
-                self.conn.commit()
+            # Index module on both labels so the join below is not a scan per label
+            for label in ENTITY_LABELS:
+                self.cursor.execute(sql.SQL(
+                    "CREATE INDEX IF NOT EXISTS {index} ON {table} "
+                    "USING btree (agtype_access_operator(VARIADIC ARRAY[properties, '\"module\"'::agtype]));"
+                ).format(
+                    index=sql.Identifier(f"{label.lower()}_module_idx"),
+                    table=sql.Identifier(self.graph_name, label)
+                ))
+
+            # Only the modules loaded by this run; with --no-clear the graph
+            # also holds earlier runs' modules, which already have their edges
+            modules = [module for module in self.stats['module_counts'] if module != 'unknown']
+
+            self.cursor.execute(f"""
+            PREPARE create_handles(agtype) AS
+            SELECT * FROM cypher('{self.graph_name}', $$
+                MATCH (k:Keeper), (m:Msg)
+                WHERE k.module = m.module AND k.module IN $modules
+                CREATE (k)-[r:HANDLES]->(m)
+                RETURN k.module, count(r)
+            $$, $1) as (module agtype, count agtype);
+            """)
+
+            self.cursor.execute("EXECUTE create_handles(%s);", (json.dumps({'modules': modules}),))
+            results = self.cursor.fetchall()
+            self.cursor.execute("DEALLOCATE create_handles;")
+            self.conn.commit()
 
+            for module, count in results:
+                module = str(module).strip('"')
+                count = int(count)
                 self.stats['relationships_created'] += count
                 print(f"  ✓ Created HANDLES relationships for module '{module}': {count}")
 
@@ -338,6 +363,20 @@ class AGEEntityLoader:
             print(f"✗ Verification error: {e}")
             self.stats['errors'].append(f"Verification error: {e}")
 
+    def iter_entities(self, json_file_path: str) -> Iterator[Tuple[str, Dict]]:
+        """Yield (label, entity) pairs per label array, streaming when ijson is available"""
+        if IJSON_AVAILABLE:
+            for label, key in ENTITY_LABELS.items():
+                with open(json_file_path, 'rb') as f:
+                    for entity in ijson.items(f, f'{key}.item', use_float=True):
+                        yield label, entity
+        else:
+            with open(json_file_path, 'rb') as f:
+                data = json.load(f)
+            for label, key in ENTITY_LABELS.items():
+                for entity in data.get(key, []):
+                    yield label, entity
+
     def load_entities_from_file(self, json_file_path: str, clear_existing: bool = True):
         """
         Load all entities from JSON file
@@ -346,36 +385,35 @@ class AGEEntityLoader:
             json_file_path: Path to extracted_entities.json
             clear_existing: Whether to clear existing data first
         """
-        print(f"Loading entities from: {json_file_path}")
-
-        # Read JSON file
-        with open(json_file_path, 'r') as f:
-            entities = json.load(f)
-
-        print(f"Found {len(entities)} entities to load\n")
+        print(f"Loading entities from: {json_file_path}\n")
 
         # Clear existing data if requested
         if clear_existing:
             self.clear_existing_data()
 
-        # Load entities
+        self.create_labels()
+
+        # Load entities in per-label batches
         print("Loading entities...")
-        for i, entity in enumerate(entities, 1):
-            entity_type = entity.get('entity_type')
-
-            if entity_type == 'Keeper':
-                success = self.load_keeper(entity)
-            elif entity_type == 'Msg':
-                success = self.load_msg(entity)
-            else:
-                print(f"✗ Unknown entity type: {entity_type}")
-                continue
-
-            # Progress indicator
-            if i % 10 == 0:
-                print(f"  Progress: {i}/{len(entities)} entities loaded")
-
-        print(f"\n✓ Finished loading {len(entities)} entities")
+        batches = {label: [] for label in ENTITY_LABELS}
+        seen = 0
+        loaded = 0
+        for label, entity in self.iter_entities(json_file_path):
+            seen += 1
+            batch = batches[label]
+            batch.append(self.entity_row(entity))
+            if len(batch) >= BATCH_SIZE:
+                loaded += self._bulk_load(label, batch)
+                batch.clear()
+                print(f"  Progress: {loaded} entities loaded ({seen} read)")
+
+        for label, batch in batches.items():
+            loaded += self._bulk_load(label, batch)
+
+        # All batches share one transaction, committed once
+        self.conn.commit()
+
+        print(f"\n✓ Finished loading {loaded}/{seen} entities")
 
         # Create relationships
         self.create_handles_relationships()
@@ -4,21 +4,258 @@ Load entities from multi_repo_entities.json and create CONTAINS edges to Modules
 Preserves existing Module nodes - does NOT clear the graph.
 """
 
+import csv
+import io
 import json
 import psycopg2
+from psycopg2 import sql
+from module_paths import module_info
 from pathlib import Path
-
-
-def escape_cypher(s: str) -> str:
-    """Escape string for Cypher query."""
-    if s is None:
-        return ''
-    return s.replace("\\", "\\\\").replace("'", "\\'").replace("\n", " ").replace("\r", "")
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# ijson streams entities one at a time instead of loading the whole file
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+# orjson encodes the per-entity JSON several times faster than json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+GRAPH_NAME = "regen_graph"
+BATCH_SIZE = 1000  # Rows per COPY and commit
+
+# (label, columns) -> rendered COPY statement, so per-row fallbacks don't rebuild it
+_COPY_STATEMENTS = {}
+
+# Label name -> (label id, sequence name), so each label is looked up once
+_LABELS = {}
+
+
+def dumps(obj) -> str:
+    """Encode obj as JSON text, with orjson when it is installed."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+
+def iter_repo_entities(json_file: Path) -> Iterator[Tuple[str, Dict]]:
+    """
+    Yield (repo, entity) pairs from the file's repos map.
+
+    With ijson only one entity is built at a time; otherwise the whole file
+    is parsed up front.
+    """
+    with open(json_file, 'rb') as f:
+        if not IJSON_AVAILABLE:
+            for repo_name, entities in json.load(f).get('repos', {}).items():
+                for entity in entities:
+                    yield repo_name, entity
+            return
+
+        repo_name = None
+        builder = None
+        depth = 0
+        for prefix, event, value in ijson.parse(f, use_float=True):
+            if builder is not None:
+                builder.event(event, value)
+                if event in ('start_map', 'start_array'):
+                    depth += 1
+                elif event in ('end_map', 'end_array'):
+                    depth -= 1
+                    if depth == 0:
+                        yield repo_name, builder.value
+                        builder = None
+            elif prefix == 'repos' and event == 'map_key':
+                repo_name = value
+            elif event == 'start_map' and repo_name is not None and prefix == f'repos.{repo_name}.item':
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+                depth = 1
+
+
+def entity_properties(entity: Dict, repo_name: str) -> Dict:
+    """Build the agtype property map for an entity node."""
+    props = {
+        'name': entity.get('name', 'unnamed'),
+        'file_path': entity.get('file_path', ''),
+        'line_number': entity.get('line_number', 0),
+        'language': entity.get('language', 'unknown'),
+        'repo': repo_name,
+        'docstring': (entity.get('docstring', '') or '')[:500],
+    }
+    # Path of the Module containing the file, so entities join to their
+    # Module on (repo, path) equality
+    info = module_info(props['file_path'])
+    props['module_path'] = info[1] if info else None
+    if 'methods' in entity:
+        props['methods'] = dumps(entity['methods'][:10])
+    if 'fields' in entity:
+        props['fields'] = dumps(entity['fields'][:10])
+    return props
+
+
+def ensure_label(cursor, label: str, kind: str = 'v') -> Tuple[int, str]:
+    """
+    Create a vertex ('v') or edge ('e') label on first use if the graph does
+    not have it yet, returning its (label id, sequence name).
+
+    Results are cached in _LABELS; drop a label from it when a rollback may
+    have undone its creation.
+    """
+    if label in _LABELS:
+        return _LABELS[label]
+    query = """
+        SELECT l.id, l.seq_name FROM ag_catalog.ag_label l
+        JOIN ag_catalog.ag_graph g ON l.graph = g.graphid
+        WHERE g.name = %s AND l.name = %s
+    """
+    cursor.execute(query, (GRAPH_NAME, label))
+    info = cursor.fetchone()
+    if info is None:
+        create = "SELECT create_vlabel(%s, %s);" if kind == 'v' else "SELECT create_elabel(%s, %s);"
+        cursor.execute(create, (GRAPH_NAME, label))
+        cursor.execute(query, (GRAPH_NAME, label))
+        info = cursor.fetchone()
+    _LABELS[label] = info
+    return info
+
+
+def module_ids(cursor) -> Dict[Tuple[str, str], str]:
+    """Map each existing Module's (repo, path) to its graph id."""
+    cursor.execute(f"""
+        SELECT * FROM cypher('{GRAPH_NAME}', $$
+            MATCH (m:Module)
+            RETURN m.repo, m.path, id(m)
+        $$) as (repo agtype, path agtype, id agtype);
+    """)
+    return {
+        (str(repo).strip('"'), str(path).strip('"')): str(graph_id)
+        for repo, path, graph_id in cursor.fetchall()
+    }
+
+
+def reserve_ids(cursor, label: str, count: int) -> List[str]:
+    """Draw graph ids for new vertices from the label's sequence, as AGE's own default does."""
+    label_id, seq_name = ensure_label(cursor, label)
+    cursor.execute(
+        "SELECT ag_catalog._graphid(%s, nextval(%s::regclass)) FROM generate_series(1, %s);",
+        (label_id, f'"{GRAPH_NAME}"."{seq_name}"', count)
+    )
+    return [graph_id for graph_id, in cursor.fetchall()]
+
+
+def copy_table(cursor, label: str, columns: Tuple[str, ...], rows: List[List]) -> int:
+    """COPY rows into a label's table and return the rows written."""
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    buf.seek(0)
+    key = (label, columns)
+    if key not in _COPY_STATEMENTS:
+        _COPY_STATEMENTS[key] = sql.SQL("COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)").format(
+            table=sql.Identifier(GRAPH_NAME, label),
+            columns=sql.SQL(', ').join(map(sql.Identifier, columns))
+        ).as_string(cursor)
+    cursor.copy_expert(_COPY_STATEMENTS[key], buf)
+    return cursor.rowcount
+
+
+def copy_with_contains(cursor, label: str, rows: List[Dict], modules: Dict[Tuple[str, str], str],
+                       ids: Optional[List[str]] = None) -> int:
+    """
+    COPY entities into a label's table together with their Module CONTAINS
+    edges, returning the number of edges written.
+
+    Vertex ids are reserved first (unless the caller already reserved them),
+    so each edge can point at its entity without a lookup, and the parent
+    Module comes from the prefetched map.
+    """
+    if ids is None:
+        ids = reserve_ids(cursor, label, len(rows))
+    copy_table(cursor, label, ('id', 'properties'),
+               [[graph_id, dumps(row)] for graph_id, row in zip(ids, rows)])
+
+    edges = [
+        [modules[(row['repo'], row['module_path'])], graph_id, '{}']
+        for graph_id, row in zip(ids, rows)
+        if (row['repo'], row['module_path']) in modules
+    ]
+    if not edges:
+        return 0
+    ensure_label(cursor, 'CONTAINS', kind='e')
+    return copy_table(cursor, 'CONTAINS', ('start_id', 'end_id', 'properties'), edges)
+
+
+def copy_each_with_contains(conn, cursor, label: str, rows: List[Dict],
+                            modules: Dict[Tuple[str, str], str], stats: Dict) -> List[Dict]:
+    """
+    COPY rows one at a time under savepoints so only bad rows are dropped.
+
+    Returns the rows that were written; failures and edges are counted in stats.
+    """
+    loaded_rows = []
+    edges = 0
+    try:
+        # Labels and every row's id up front, outside the savepoints: one
+        # round trip instead of one per row, and sequences ignore rollbacks
+        ensure_label(cursor, 'CONTAINS', kind='e')
+        ids = reserve_ids(cursor, label, len(rows))
+        for row, graph_id in zip(rows, ids):
+            cursor.execute("SAVEPOINT entity;")
+            try:
+                row_edges = copy_with_contains(cursor, label, [row], modules, [graph_id])
+                cursor.execute("RELEASE SAVEPOINT entity;")
+                loaded_rows.append(row)
+                edges += row_edges
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT entity;")
+                stats['errors'] += 1
+                if stats['errors'] <= 2:
+                    print(f"  Error: {row['name']} - {e}")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        # Their creation may have been rolled back too
+        _LABELS.pop(label, None)
+        _LABELS.pop('CONTAINS', None)
+        stats['errors'] += len(rows)
+        print(f"  {label}: Error - {e}")
+        return []
+    stats['edges'] += edges
+    return loaded_rows
+
+
+def load_label(conn, cursor, entity_type: str, rows: List[Dict],
+               modules: Dict[Tuple[str, str], str], stats: Dict):
+    """COPY one batch of an entity type's rows and their edges and commit, recording stats."""
+    label = entity_type.replace(' ', '_')
+    try:
+        stats['edges'] += copy_with_contains(cursor, label, rows, modules)
+        conn.commit()
+        loaded_rows = rows
+
+    except Exception as e:
+        conn.rollback()
+        # Their creation may have been rolled back too
+        _LABELS.pop(label, None)
+        _LABELS.pop('CONTAINS', None)
+        print(f"  {label}: COPY failed, retrying row by row - {e}")
+        loaded_rows = copy_each_with_contains(conn, cursor, label, rows, modules, stats)
+
+    for row in loaded_rows:
+        stats['loaded'] += 1
+        stats['by_type'][entity_type] = stats['by_type'].get(entity_type, 0) + 1
+        stats['by_repo'][row['repo']] = stats['by_repo'].get(row['repo'], 0) + 1
+    print(f"  ✓ {label}: {len(loaded_rows)} loaded, {len(rows) - len(loaded_rows)} errors")
 
 
 def main():
     DB_CONNECTION = "postgresql://darrenzal@localhost:5432/eliza"
-    GRAPH_NAME = "regen_graph"
     JSON_FILE = Path(__file__).parent / "tools" / "data" / "multi_repo_entities.json"
 
     print("=" * 70)
@@ -27,80 +264,36 @@ def main():
 
     # Connect
     conn = psycopg2.connect(DB_CONNECTION)
+    conn.autocommit = False
     cursor = conn.cursor()
     cursor.execute("LOAD 'age';")
     cursor.execute('SET search_path = ag_catalog, "$user", public;')
+    # Entities can be reloaded from the JSON, so commits need not wait for
+    # the WAL flush. Remove this for loads that must be crash-durable.
+    cursor.execute("SET synchronous_commit = off;")
     print("✓ Connected to database")
 
-    # Load JSON
-    with open(JSON_FILE, 'r') as f:
-        data = json.load(f)
-
-    repos_data = data.get('repos', {})
-    print(f"✓ Loaded data for {len(repos_data)} repositories")
-
-    # Count total entities
-    total = sum(len(entities) for entities in repos_data.values())
-    print(f"  Total entities: {total}")
-
     # Stats
-    stats = {'loaded': 0, 'by_type': {}, 'by_repo': {}, 'errors': 0}
-
-    # Load entities by repo
-    for repo_name, entities in repos_data.items():
-        print(f"\nLoading {len(entities)} entities from {repo_name}...")
-        repo_stats = {'loaded': 0, 'errors': 0}
-
-        for entity in entities:
-            try:
-                entity_type = entity.get('entity_type', 'Unknown')
-                name = escape_cypher(entity.get('name', 'unnamed'))
-                file_path = escape_cypher(entity.get('file_path', ''))
-                line_number = entity.get('line_number', 0)
-                language = entity.get('language', 'unknown')
-                docstring = escape_cypher(entity.get('docstring', '') or '')[:500]
-
-                # Build extra properties
-                extra_props = ""
-                if 'methods' in entity:
-                    methods = json.dumps(entity['methods'][:10])
-                    extra_props += f", methods: '{escape_cypher(methods)}'"
-                if 'fields' in entity:
-                    fields = json.dumps(entity['fields'][:10])
-                    extra_props += f", fields: '{escape_cypher(fields)}'"
-
-                label = entity_type.replace(' ', '_')
-
-                query = f"""
-                SELECT * FROM cypher('{GRAPH_NAME}', $$
-                    CREATE (n:{label} {{
-                        name: '{name}',
-                        file_path: '{file_path}',
-                        line_number: {line_number},
-                        language: '{language}',
-                        repo: '{repo_name}',
-                        docstring: '{docstring}'
-                        {extra_props}
-                    }})
-                    RETURN id(n)
-                $$) as (id agtype);
-                """
-                cursor.execute(query)
-                conn.commit()
-
-                stats['loaded'] += 1
-                repo_stats['loaded'] += 1
-                stats['by_type'][entity_type] = stats['by_type'].get(entity_type, 0) + 1
-                stats['by_repo'][repo_name] = stats['by_repo'].get(repo_name, 0) + 1
-
-            except Exception as e:
-                stats['errors'] += 1
-                repo_stats['errors'] += 1
-                conn.rollback()
-                if repo_stats['errors'] <= 2:
-                    print(f"  Error: {entity.get('name', 'unknown')} - {e}")
-
-        print(f"  ✓ Loaded: {repo_stats['loaded']}, Errors: {repo_stats['errors']}")
+    stats = {'loaded': 0, 'by_type': {}, 'by_repo': {}, 'errors': 0, 'edges': 0}
+
+    # Existing Modules, so CONTAINS edges can be written with their entities
+    modules = module_ids(cursor)
+    print(f"✓ Found {len(modules)} modules")
+
+    # Stream entities into per-label batches, each written with one COPY
+    print(f"Loading entities from {JSON_FILE}...")
+    by_label = {}
+    for repo_name, entity in iter_repo_entities(JSON_FILE):
+        entity_type = entity.get('entity_type', 'Unknown')
+        rows = by_label.setdefault(entity_type, [])
+        rows.append(entity_properties(entity, repo_name))
+        if len(rows) >= BATCH_SIZE:
+            load_label(conn, cursor, entity_type, rows, modules, stats)
+            rows.clear()
+
+    for entity_type, rows in by_label.items():
+        if rows:
+            load_label(conn, cursor, entity_type, rows, modules, stats)
 
     print("\n" + "=" * 70)
     print(f"ENTITIES LOADED: {stats['loaded']}")
@@ -114,39 +307,7 @@ def main():
     for r, c in sorted(stats['by_repo'].items(), key=lambda x: -x[1]):
         print(f"  {r}: {c}")
 
-    # Now create CONTAINS edges
-    print("\n" + "=" * 70)
-    print("CREATING CONTAINS EDGES (Module -> Entity)")
-    print("=" * 70)
-
-    entity_labels = list(stats['by_type'].keys())
-    total_edges = 0
-
-    for label in entity_labels:
-        try:
-            # Match entities to modules by repo + file_path STARTS WITH module.path
-            query = f"""
-            SELECT * FROM cypher('{GRAPH_NAME}', $$
-                MATCH (m:Module), (e:{label})
-                WHERE e.repo = m.repo AND e.file_path STARTS WITH (m.repo + '/' + m.path)
-                MERGE (m)-[:CONTAINS]->(e)
-                RETURN count(*) as cnt
-            $$) as (cnt agtype);
-            """
-            cursor.execute(query)
-            result = cursor.fetchone()
-            count = int(str(result[0]))
-            conn.commit()
-
-            if count > 0:
-                print(f"  {label}: {count} edges")
-                total_edges += count
-
-        except Exception as e:
-            print(f"  {label}: Error - {e}")
-            conn.rollback()
-
-    print(f"\nTotal CONTAINS edges: {total_edges}")
+    print(f"\nCONTAINS edges (Module -> Entity): {stats['edges']}")
 
     # Verify
     print("\n" + "=" * 70)
@@ -4,12 +4,44 @@ Multi-Language Entity Loader for Apache AGE Graph Database.
 Loads entities from multi_repo_entities.json into regen_graph.
 """
 
+import csv
+import io
 import json
+import posixpath
 import psycopg2
 import re
-from typing import Dict, List
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from heapq import nlargest
+from itertools import combinations, islice
+from psycopg2 import sql
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
 
+# ijson streams entities one at a time instead of loading the whole file
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+# orjson encodes the per-entity JSON several times faster than json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+BATCH_SIZE = 1000  # Rows per COPY and commit
+MAX_MODULE_SIZE = 500  # Larger directories get no SAME_MODULE edges
+
+
+def dumps(obj) -> str:
+    """Encode obj as JSON text, with orjson when it is installed."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
 
 class MultiLangEntityLoader:
     """Loads multi-language entities into Apache AGE graph."""
@@ -19,6 +51,9 @@ class MultiLangEntityLoader:
         self.graph_name = graph_name
         self.conn = None
         self.cursor = None
+        self.labels = {}  # Label name -> (label id, sequence name)
+        self.modules = defaultdict(list)  # (repo, directory) -> entity ids
+        self.copy_statements = {}  # (label, columns) -> COPY statement text
         self.stats = {
             'loaded': 0,
             'by_type': {},
@@ -30,16 +65,41 @@ class MultiLangEntityLoader:
     def connect(self):
         """Connect to database and load AGE."""
         self.conn = psycopg2.connect(self.db_connection)
+        self.conn.autocommit = False
         self.cursor = self.conn.cursor()
         self.cursor.execute("LOAD 'age';")
         self.cursor.execute('SET search_path = ag_catalog, "$user", public;')
+        # Commits skip the synchronous WAL flush for the whole session: a
+        # crash mid-load just means re-running it. Drop this line when
+        # loading into a graph that must survive a crash without a reload.
+        self.cursor.execute("SET synchronous_commit = off;")
+        self.prepare_statements()
         print("✓ Connected to database, AGE loaded")
 
-    def escape_cypher(self, s: str) -> str:
-        """Escape string for Cypher query."""
-        if s is None:
-            return ''
-        return s.replace("\\", "\\\\").replace("'", "\\'").replace("\n", " ").replace("\r", "")
+    def prepare_statements(self):
+        """
+        Prepare the parameterized Repository statements.
+
+        Values travel in an agtype map, so nothing is escaped into the query
+        text and each statement is planned once per session.
+        """
+        self.cursor.execute(f"""
+        PREPARE create_repository(agtype) AS
+        SELECT * FROM cypher('{self.graph_name}', $$
+            CREATE (r:Repository {{name: $repo}})
+            RETURN r
+        $$, $1) as (r agtype);
+        """)
+
+        self.cursor.execute(f"""
+        PREPARE link_repository(agtype) AS
+        SELECT * FROM cypher('{self.graph_name}', $$
+            MATCH (r:Repository {{name: $repo}})
+            MATCH (n) WHERE n.repo = $repo AND NOT n:Repository
+            CREATE (r)-[:CONTAINS]->(n)
+            RETURN count(*) as cnt
+        $$, $1) as (cnt agtype);
+        """)
 
     def extract_repo(self, file_path: str) -> str:
         """Extract repository name from file path.
@@ -75,64 +135,163 @@ class MultiLangEntityLoader:
         self.conn.commit()
         print("✓ Cleared existing graph data")
 
-    def load_entity(self, entity: Dict) -> bool:
-        """Load a single entity into the graph."""
+    def entity_row(self, entity: Dict) -> Dict:
+        """Build the node properties for an entity; absent lists stay null and are not stored."""
+        file_path = entity.get('file_path', '')
+        row = {
+            'name': entity.get('name', 'unnamed'),
+            'file_path': file_path,
+            'line_number': entity.get('line_number', 0),
+            'language': entity.get('language', 'unknown'),
+            'repo': self.extract_repo(file_path),
+            'docstring': (entity.get('docstring', '') or '')[:500],  # Limit docstring length
+            'directory': posixpath.dirname(file_path),
+        }
+        for key in ('methods', 'fields', 'properties'):
+            row[key] = dumps(entity[key][:10]) if key in entity else None
+        return row
+
+    def ensure_label(self, label: str, kind: str = 'v') -> Tuple[int, str]:
+        """
+        Create a vertex ('v') or edge ('e') label on first use if the graph
+        does not have it yet, returning its (label id, sequence name).
+        """
+        if label in self.labels:
+            return self.labels[label]
+        query = """
+            SELECT l.id, l.seq_name FROM ag_catalog.ag_label l
+            JOIN ag_catalog.ag_graph g ON l.graph = g.graphid
+            WHERE g.name = %s AND l.name = %s
+        """
+        self.cursor.execute(query, (self.graph_name, label))
+        info = self.cursor.fetchone()
+        if info is None:
+            create = "SELECT create_vlabel(%s, %s);" if kind == 'v' else "SELECT create_elabel(%s, %s);"
+            self.cursor.execute(create, (self.graph_name, label))
+            self.cursor.execute(query, (self.graph_name, label))
+            info = self.cursor.fetchone()
+        self.labels[label] = info
+        return info
+
+    def reserve_ids(self, label: str, count: int) -> List[str]:
+        """Draw graph ids for new vertices from the label's sequence, as AGE's own default does."""
+        label_id, seq_name = self.ensure_label(label)
+        self.cursor.execute(
+            "SELECT ag_catalog._graphid(%s, nextval(%s::regclass)) FROM generate_series(1, %s);",
+            (label_id, f'"{self.graph_name}"."{seq_name}"', count)
+        )
+        return [graph_id for graph_id, in self.cursor.fetchall()]
+
+    def copy_statement(self, label: str, columns: Tuple[str, ...]) -> str:
+        """COPY statement text for a label's table, rendered once per label."""
+        key = (label, columns)
+        if key not in self.copy_statements:
+            self.copy_statements[key] = sql.SQL("COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)").format(
+                table=sql.Identifier(self.graph_name, label),
+                columns=sql.SQL(', ').join(map(sql.Identifier, columns))
+            ).as_string(self.conn)
+        return self.copy_statements[key]
+
+    def copy_rows(self, label: str, rows: List[Dict], ids: Optional[List[str]] = None) -> List[str]:
+        """
+        COPY property maps straight into a label's table and return their ids.
+
+        Ids are reserved up front, unless given, so edges can be written
+        without looking the vertices up again, and no Cypher is parsed per row. Null values
+        are left out, as a Cypher CREATE would.
+        """
+        if ids is None:
+            ids = self.reserve_ids(label, len(rows))
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for graph_id, row in zip(ids, rows):
+            writer.writerow([graph_id, dumps({k: v for k, v in row.items() if v is not None})])
+        buf.seek(0)
+        self.cursor.copy_expert(self.copy_statement(label, ('id', 'properties')), buf)
+        return ids
+
+    def copy_edges(self, label: str, pairs: Iterable[Tuple[str, str]]) -> int:
+        """COPY (start id, end id) pairs into an edge label's table and return the rows written."""
+        self.ensure_label(label, kind='e')
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for start_id, end_id in pairs:
+            writer.writerow([start_id, end_id, '{}'])
+        buf.seek(0)
+        self.cursor.copy_expert(self.copy_statement(label, ('start_id', 'end_id', 'properties')), buf)
+        return self.cursor.rowcount
+
+    def load_batch(self, entity_type: str, entities: List[Dict]) -> int:
+        """
+        Create a batch of same-typed entities with one COPY in one transaction.
+
+        If the batch fails it is rolled back and replayed entity by entity in
+        a fresh transaction, so a bad entity only loses itself.
+        """
+        label = entity_type.replace(' ', '_')
+        rows = [self.entity_row(entity) for entity in entities]
+        try:
+            ids = self.copy_rows(label, rows)
+            self.conn.commit()
+
+        except Exception as e:
+            self.conn.rollback()
+            self.labels.pop(label, None)  # Its creation may have been rolled back too
+            print(f"  ✗ Batch of {len(entities)} {label} failed, loading individually: {e}")
+            try:
+                # One round trip for every id; sequences ignore savepoint rollbacks anyway
+                ids = self.reserve_ids(label, len(entities))
+            except Exception as e:
+                self.conn.rollback()
+                self.labels.pop(label, None)
+                self.stats['errors'].append(f"Error loading {len(entities)} {label} entities: {e}")
+                return 0
+            loaded = sum(self.load_entity(entity, graph_id) for entity, graph_id in zip(entities, ids))
+            self.conn.commit()
+            return loaded
+
+        self.stats['loaded'] += len(ids)
+        self.stats['by_type'][entity_type] = self.stats['by_type'].get(entity_type, 0) + len(rows)
+        for graph_id, row in zip(ids, rows):
+            language = row['language']
+            repo = row['repo']
+            self.modules[(repo, row['directory'])].append(graph_id)
+            self.stats['by_language'][language] = self.stats['by_language'].get(language, 0) + 1
+            self.stats['by_repo'][repo] = self.stats['by_repo'].get(repo, 0) + 1
+        return len(ids)
+
+    def load_entity(self, entity: Dict, graph_id: str) -> bool:
+        """
+        Load a single entity under an id reserved by the caller, inside the
+        caller's transaction.
+
+        The entity gets its own savepoint, so a failure only undoes this entity.
+        It goes through the same COPY path as a one-row batch.
+        """
+        self.cursor.execute("SAVEPOINT entity;")
         try:
             entity_type = entity.get('entity_type', 'Unknown')
-            name = self.escape_cypher(entity.get('name', 'unnamed'))
-            file_path = self.escape_cypher(entity.get('file_path', ''))
-            line_number = entity.get('line_number', 0)
-            language = entity.get('language', 'unknown')
-            docstring = self.escape_cypher(entity.get('docstring', ''))[:500]  # Limit docstring length
-            repo = self.extract_repo(file_path)
-
-            # Build properties based on entity type
-            extra_props = ""
-
-            # Handle methods/fields/properties
-            if 'methods' in entity:
-                methods = json.dumps(entity['methods'][:10])  # Limit methods
-                extra_props += f", methods: '{self.escape_cypher(methods)}'"
-            if 'fields' in entity:
-                fields = json.dumps(entity['fields'][:10])
-                extra_props += f", fields: '{self.escape_cypher(fields)}'"
-            if 'properties' in entity:
-                properties = json.dumps(entity['properties'][:10])
-                extra_props += f", properties: '{self.escape_cypher(properties)}'"
-
-            # Use entity_type as the node label
             label = entity_type.replace(' ', '_')
+            row = self.entity_row(entity)
 
-            query = f"""
-            SELECT * FROM cypher('{self.graph_name}', $$
-                CREATE (n:{label} {{
-                    name: '{name}',
-                    file_path: '{file_path}',
-                    line_number: {line_number},
-                    language: '{language}',
-                    repo: '{repo}',
-                    docstring: '{docstring}'
-                    {extra_props}
-                }})
-                RETURN n
-            $$) as (n agtype);
-            """
-
-            self.cursor.execute(query)
-            self.conn.commit()
+            self.copy_rows(label, [row], [graph_id])
+            self.cursor.execute("RELEASE SAVEPOINT entity;")
 
             # Update stats
+            language = row['language']
+            repo = row['repo']
             self.stats['loaded'] += 1
             self.stats['by_type'][entity_type] = self.stats['by_type'].get(entity_type, 0) + 1
             self.stats['by_language'][language] = self.stats['by_language'].get(language, 0) + 1
             self.stats['by_repo'][repo] = self.stats['by_repo'].get(repo, 0) + 1
+            self.modules[(repo, row['directory'])].append(graph_id)
 
             return True
 
         except Exception as e:
             error_msg = f"Error loading {entity.get('name', 'unknown')}: {e}"
             self.stats['errors'].append(error_msg)
-            self.conn.rollback()
+            self.cursor.execute("ROLLBACK TO SAVEPOINT entity;")
             return False
 
     def create_repo_relationships(self):
@@ -144,27 +303,15 @@ class MultiLangEntityLoader:
 
         for repo in repos:
             try:
+                params = (json.dumps({'repo': repo}),)
+
                 # Create Repository node
-                query = f"""
-                SELECT * FROM cypher('{self.graph_name}', $$
-                    CREATE (r:Repository {{name: '{repo}'}})
-                    RETURN r
-                $$) as (r agtype);
-                """
-                self.cursor.execute(query)
+                self.cursor.execute("EXECUTE create_repository(%s);", params)
                 self.conn.commit()
 
                 # Create CONTAINS relationships to all entities in this repo
                 # We'll do this by matching on the repo property
-                query = f"""
-                SELECT * FROM cypher('{self.graph_name}', $$
-                    MATCH (r:Repository {{name: '{repo}'}})
-                    MATCH (n) WHERE n.repo = '{repo}' AND NOT n:Repository
-                    CREATE (r)-[:CONTAINS]->(n)
-                    RETURN count(*) as cnt
-                $$) as (cnt agtype);
-                """
-                self.cursor.execute(query)
+                self.cursor.execute("EXECUTE link_repository(%s);", params)
                 result = self.cursor.fetchone()
                 self.conn.commit()
                 print(f"  ✓ Repository '{repo}' → {result[0]} entities")
@@ -174,28 +321,38 @@ class MultiLangEntityLoader:
                 self.conn.rollback()
 
     def create_module_relationships(self):
-        """Create relationships based on file path structure (module/package grouping)."""
+        """
+        Create SAME_MODULE relationships between entities in the same directory.
+
+        Entities were grouped by (repo, directory) as they were loaded, so the
+        pairs come straight from those groups and are COPYed in; nothing is
+        joined in the graph. Directories above MAX_MODULE_SIZE are skipped,
+        since their pair count grows quadratically.
+        """
         print("\nCreating module relationships...")
 
-        # For TypeScript/Python, group by directory
+        skipped = [key for key, ids in self.modules.items() if len(ids) > MAX_MODULE_SIZE]
+        pairs = (
+            pair
+            for ids in self.modules.values() if len(ids) <= MAX_MODULE_SIZE
+            for pair in combinations(ids, 2)
+        )
         try:
-            # Create SAME_MODULE relationships for entities in the same directory
-            query = f"""
-            SELECT * FROM cypher('{self.graph_name}', $$
-                MATCH (a), (b)
-                WHERE a <> b
-                  AND a.file_path IS NOT NULL
-                  AND b.file_path IS NOT NULL
-                  AND split(a.file_path, '/')[0..-2] = split(b.file_path, '/')[0..-2]
-                  AND id(a) < id(b)
-                CREATE (a)-[:SAME_MODULE]->(b)
-                RETURN count(*) as cnt
-            $$) as (cnt agtype);
-            """
-            # This query might be too slow for large graphs, skip for now
-            print("  ⚠ Skipping SAME_MODULE (can be slow for large graphs)")
+            created = 0
+            while True:
+                chunk = list(islice(pairs, BATCH_SIZE))
+                if not chunk:
+                    break
+                created += self.copy_edges('SAME_MODULE', chunk)
+            self.conn.commit()
+            print(f"  ✓ SAME_MODULE relationships: {created}")
+            if skipped:
+                print(f"  ⚠ Skipped {len(skipped)} directories with more than {MAX_MODULE_SIZE} entities")
+
         except Exception as e:
             print(f"  ⚠ Module relationships: {e}")
+            self.conn.rollback()
+            self.labels.pop('SAME_MODULE', None)
 
     def verify_graph(self):
         """Verify the loaded graph."""
@@ -256,29 +413,56 @@ class MultiLangEntityLoader:
         except Exception as e:
             print(f"Verification error: {e}")
 
+    def iter_entities(self, json_path: str) -> Iterator[Dict]:
+        """Yield entities from either an {'all_entities': [...]} file or a bare list."""
+        with open(json_path, 'rb') as f:
+            if not IJSON_AVAILABLE:
+                data = json.load(f)
+                yield from data.get('all_entities', []) if isinstance(data, dict) else data
+                return
+
+            # Peek at the first token to pick the array's path
+            head = f.read(64).lstrip()
+            f.seek(0)
+            prefix = 'item' if head.startswith(b'[') else 'all_entities.item'
+            yield from ijson.items(f, prefix, use_float=True)
+
     def load_from_file(self, json_path: str, clear_existing: bool = True):
         """Load entities from JSON file."""
         print(f"Loading from: {json_path}")
 
-        with open(json_path, 'r') as f:
-            data = json.load(f)
-
-        entities = data.get('all_entities', data)  # Handle both formats
-        print(f"Found {len(entities)} entities\n")
-
         if clear_existing:
             self.clear_graph()
 
-        # Load entities with progress
-        for i, entity in enumerate(entities, 1):
-            self.load_entity(entity)
-            if i % 500 == 0:
-                print(f"  Progress: {i}/{len(entities)}")
+        # Load entities in per-type batches. A single writer thread owns the
+        # connection, so the next batch is gathered while the server executes
+        # the previous one; at most one batch is in flight.
+        batches = {}
+        pending = None
+        with ThreadPoolExecutor(max_workers=1) as writer:
+            for i, entity in enumerate(self.iter_entities(json_path), 1):
+                entity_type = entity.get('entity_type', 'Unknown')
+                batch = batches.setdefault(entity_type, [])
+                batch.append(entity)
+                if len(batch) >= BATCH_SIZE:
+                    if pending:
+                        pending.result()
+                    pending = writer.submit(self.load_batch, entity_type, batch)
+                    batches[entity_type] = []
+                    print(f"  Progress: {i}")
+
+            remaining = [writer.submit(self.load_batch, entity_type, batch)
+                         for entity_type, batch in batches.items() if batch]
+
+        # Surface any error raised on the writer thread
+        for future in ([pending] if pending else []) + remaining:
+            future.result()
 
         print(f"\n✓ Loaded {self.stats['loaded']} entities")
 
         # Create relationships
         self.create_repo_relationships()
+        self.create_module_relationships()
 
         # Verify
         self.verify_graph()
@@ -295,7 +479,7 @@ class MultiLangEntityLoader:
         print(f"\nTotal entities loaded: {self.stats['loaded']}")
 
         print("\nBy Type:")
-        for t, c in sorted(self.stats['by_type'].items(), key=lambda x: -x[1])[:10]:
+        for t, c in nlargest(10, self.stats['by_type'].items(), key=lambda x: x[1]):
             print(f"  {t}: {c}")
 
         print("\nBy Language:")
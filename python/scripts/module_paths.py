@@ -0,0 +1,44 @@
+"""
+Module paths - Groups code entity file paths into Modules.
+
+raptor_summarizer creates Module nodes with this rule and
+load_entities_and_link joins entities to them on its result, so both must
+use this one implementation.
+"""
+
+import functools
+import re
+from typing import Optional, Tuple
+
+# First three components of an entity path: repo, top-level directory, next level
+_PATH_RE = re.compile(r'([^/]*)/([^/]*)(?:/([^/]*))?')
+
+# Top-level directories whose children are the modules
+PACKAGE_DIRS = frozenset(('src', 'lib', 'packages', 'internal', 'pkg'))
+
+
+@functools.lru_cache(maxsize=100_000)
+def module_info(file_path: str) -> Optional[Tuple[str, str, str]]:
+    """
+    Map a file path to (repo, module_path, module_name).
+
+    Cached because every entity in a file, and usually every file in a
+    directory, resolves to the same module.
+    """
+    match = _PATH_RE.match(file_path)
+    if not match:
+        return None
+
+    repo, top, sub = match.groups()
+
+    # For regen-ledger, look for x/ modules
+    if repo == 'regen-ledger' and top == 'x' and sub is not None:
+        return (repo, f"x/{sub}", sub)  # e.g., 'ecocredit'
+
+    # For other repos, use top-level directory as module
+    # Common patterns: src/, lib/, packages/, etc.
+    if top in PACKAGE_DIRS and sub is not None:
+        return (repo, f"{top}/{sub}", sub)
+
+    # Use first directory as module
+    return (repo, top, top)
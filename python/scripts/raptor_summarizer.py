@@ -16,25 +16,116 @@ Usage:
     python raptor_summarizer.py [--dry-run] [--skip-llm] [--skip-embed]
 """
 
+import functools
+import hashlib
+import io
 import json
 import os
+import sqlite3
 import sys
-import re
+import threading
+import time
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 from dataclasses import dataclass, field
-from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import Counter, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
 import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import Json, execute_values
+from module_paths import module_info
+
+# orjson serializes Cypher parameters and vectors several times faster than json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# ijson streams entities one at a time instead of loading the whole file
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+# tiktoken budgets summary content in exact tokens; otherwise it is budgeted in characters
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# pgvector sends float32 arrays in binary; fall back to vector text literals
+try:
+    from pgvector.psycopg2 import register_vector
+    PGVECTOR_AVAILABLE = True
+except ImportError:
+    PGVECTOR_AVAILABLE = False
+
+# Summary/embedding cache, keyed by content hash
+CACHE_FILE = Path(__file__).parent / "raptor_cache.sqlite"
+SUMMARY_MODEL = "gpt-4.1-mini"
+SUMMARY_PROMPT_VERSION = 1  # Bump whenever the generate_summary prompt changes
+# Cached summaries are reused only when written by this model and prompt
+SUMMARY_VERSION = f"{SUMMARY_MODEL}/prompt-v{SUMMARY_PROMPT_VERSION}"
+BATCH_SIZE = 16  # Modules summarized and embedded per batch
+# Concurrent API calls: a whole batch in flight; the token buckets enforce the rate
+PARALLEL_WORKERS = BATCH_SIZE
+HTTP_RETRIES = 3  # Retries on 429/5xx, with exponential backoff
+OPENAI_RPM = 500  # Account request limit for SUMMARY_MODEL
+OPENAI_TPM = 200_000  # Account token limit for SUMMARY_MODEL
+SUMMARY_MAX_TOKENS = 500
+SUMMARY_CONTENT_TOKENS = 3000  # Module content budget per prompt when tiktoken is available
+MIN_ENTITIES = 3  # Smaller modules get a templated summary instead of an LLM call
+EMBED_BATCH_SIZE = 32  # Texts per BGE request
+SEMANTIC_THRESHOLD = 0.95  # Cosine similarity above which a cached summary is reused
+SEMANTIC_PREFIX_CHARS = 2000  # Module content embedded for the semantic lookup
+
+
+def json_dumps(obj: Any) -> str:
+    """Serialize to compact JSON text; numpy arrays become JSON arrays."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(obj, separators=(',', ':'), default=lambda o: o.tolist())
+
+
+@functools.lru_cache(maxsize=1)
+def summary_encoding():
+    """Return the SUMMARY_MODEL tokenizer, or None if tiktoken or its BPE data is unavailable."""
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(SUMMARY_MODEL)
+        except KeyError:
+            # Releases that predate the model; the gpt-4.1 family uses o200k_base
+            return tiktoken.get_encoding('o200k_base')
+    except Exception as e:
+        # The BPE file is downloaded on first use
+        print(f"⚠ Could not load tokenizer ({e}), budgeting summary content by characters")
+        return None
+
+
+def normalize_embedding(values: Any) -> Optional[np.ndarray]:
+    """Convert an embedding to a unit-length float32 array; None if empty or zero."""
+    if values is None or len(values) == 0:
+        return None
+    vector = np.asarray(values, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
 
-# Checkpoint configuration
-CHECKPOINT_FILE = Path(__file__).parent / "raptor_checkpoint.json"
-CHECKPOINT_INTERVAL = 10  # Save every N modules
-PARALLEL_WORKERS = 5  # Number of concurrent API calls
 
+def strip_module_header(content: str) -> str:
+    """Drop the Module/Repository/Path lines that open Module.get_content_for_summary()."""
+    return content.split('\n', 3)[-1]
 
-@dataclass
+
+@dataclass(slots=True)
 class Entity:
     """Represents a code entity (function, class, etc.)"""
     name: str
@@ -48,53 +139,77 @@ class Entity:
     repo: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Module:
     """Represents a module with aggregated content"""
     name: str
     repo: str
     path: str
     entities: List[Entity] = field(default_factory=list)
-    entity_types: Dict[str, int] = field(default_factory=dict)
+    entity_types: Counter = field(default_factory=Counter)
     summary: Optional[str] = None
-    embedding: Optional[List[float]] = None
+    embedding: Optional[np.ndarray] = None  # Unit-length float32
 
     @property
     def entity_count(self) -> int:
         return len(self.entities)
 
-    def get_content_for_summary(self, max_chars: int = 8000) -> str:
-        """Generate content string for LLM summarization."""
-        lines = [
-            f"# Module: {self.name}",
-            f"Repository: {self.repo}",
-            f"Path: {self.path}",
-            f"Total Entities: {self.entity_count}",
-            "",
-            "## Entity Types:",
-        ]
-
-        for etype, count in sorted(self.entity_types.items(), key=lambda x: -x[1]):
-            lines.append(f"- {etype}: {count}")
-
-        lines.extend(["", "## Key Entities:"])
+    def get_template_summary(self) -> str:
+        """Describe a module too small to be worth an LLM summary from its entities."""
+        entities = ', '.join(f"{entity.name} ({entity.entity_type})" for entity in self.entities)
+        noun = 'entity' if self.entity_count == 1 else 'entities'
+        return f"Module {self.name} in {self.repo} ({self.path}) contains {self.entity_count} {noun}: {entities}."
+
+    def get_content_for_summary(self, max_chars: int = 8000, max_tokens: int = SUMMARY_CONTENT_TOKENS) -> str:
+        """
+        Generate content string for LLM summarization.
+
+        Entities are added until the content reaches max_tokens tokens of
+        the summary model, or max_chars characters if no tokenizer is
+        available.
+        """
+        encoding = summary_encoding()
+        buf = io.StringIO()
+        buf.write(
+            f"# Module: {self.name}\n"
+            f"Repository: {self.repo}\n"
+            f"Path: {self.path}\n"
+            f"Total Entities: {self.entity_count}\n"
+            "\n"
+            "## Entity Types:\n"
+        )
+
+        for etype, count in self.entity_types.most_common():
+            buf.write(f"- {etype}: {count}\n")
+
+        buf.write("\n## Key Entities:")
+
+        if encoding:
+            used, limit = len(encoding.encode(buf.getvalue())), max_tokens
+        else:
+            used, limit = buf.tell(), max_chars
+
+        def fits(piece: str) -> bool:
+            nonlocal used
+            cost = len(encoding.encode(piece)) if encoding else len(piece)
+            if used + cost > limit:
+                return False
+            used += cost
+            return True
 
         # Group entities by type and include docstrings
         by_type = defaultdict(list)
         for entity in self.entities:
             by_type[entity.entity_type].append(entity)
 
-        chars_used = len('\n'.join(lines))
-
         for etype, entities in sorted(by_type.items(), key=lambda x: -len(x[1])):
-            type_header = f"\n### {etype}s ({len(entities)}):\n"
-            if chars_used + len(type_header) > max_chars:
+            type_header = f"\n\n### {etype}s ({len(entities)}):\n"
+            if not fits(type_header):
                 break
-            lines.append(type_header)
-            chars_used += len(type_header)
+            buf.write(type_header)
 
             for entity in entities[:10]:  # Limit per type
-                entry = f"- **{entity.name}**"
+                entry = f"\n- **{entity.name}**"
                 if entity.docstring:
                     # Truncate long docstrings
                     doc = entity.docstring[:200].replace('\n', ' ')
@@ -103,12 +218,47 @@ class Module:
                     entry += f" (methods: {', '.join(entity.methods[:5])})"
 
                 entry += "\n"
-                if chars_used + len(entry) > max_chars:
+                if not fits(entry):
                     break
-                lines.append(entry)
-                chars_used += len(entry)
+                buf.write(entry)
+
+        return buf.getvalue()
+
+
+def module_key(module: Module) -> str:
+    """Identify a module by repo and path, the parts its summary names."""
+    return f"{module.repo}/{module.path}"
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that blocks callers until capacity is available.
 
-        return '\n'.join(lines)
+    Refills continuously at rate per second up to capacity, so requests are
+    paced client-side instead of being rejected with 429s and retried.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount: float = 1):
+        """Take amount tokens, sleeping until the bucket has refilled enough."""
+        # A request larger than the bucket waits for a full bucket
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
 
 
 class RaptorSummarizer:
@@ -127,6 +277,21 @@ class RaptorSummarizer:
         self.openai_api_key = openai_api_key or os.environ.get("OPENAI_API_KEY")
         self.conn = None
         self.cursor = None
+        self.cache = None
+        self.cache_lock = threading.Lock()  # Summaries and embeddings use the cache from different threads
+        # int8 rows with per-row scales; rows past semantic_count are spare
+        self.semantic_vectors: Optional[np.ndarray] = None
+        self.semantic_scales: Optional[np.ndarray] = None
+        self.semantic_count = 0
+        self.semantic_summaries: List[str] = []
+        # Row indices per module ("repo/path"); a summary is only reused for its own module
+        self.semantic_rows: Dict[str, List[int]] = defaultdict(list)
+        self.bge_batch_supported = True
+        self.session = self._make_session()
+
+        # Client-side OpenAI rate limits: requests and estimated tokens per second
+        self.request_bucket = TokenBucket(OPENAI_RPM / 60, OPENAI_RPM / 60)
+        self.token_bucket = TokenBucket(OPENAI_TPM / 60, OPENAI_TPM / 60)
 
         # Module discovery patterns
         self.regen_ledger_modules = [
@@ -137,20 +302,88 @@ class RaptorSummarizer:
         self.stats = {
             'modules_discovered': 0,
             'summaries_generated': 0,
+            'summaries_cached': 0,
+            'summaries_reused': 0,
+            'summaries_templated': 0,
             'embeddings_created': 0,
+            'embeddings_cached': 0,
             'nodes_created': 0,
             'edges_created': 0,
             'errors': []
         }
 
+    @staticmethod
+    def _make_session() -> requests.Session:
+        """
+        Create the HTTP session shared by all OpenAI and BGE calls.
+
+        Pooled keep-alive connections avoid a TCP/TLS handshake per request.
+        Rate limits and transient server errors are retried with backoff,
+        honoring Retry-After; the final response is returned either way.
+        """
+        retry = Retry(
+            total=HTTP_RETRIES,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=None,  # The APIs are all POST
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=PARALLEL_WORKERS,
+            pool_maxsize=PARALLEL_WORKERS * 2,
+            max_retries=retry
+        )
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
     def connect(self):
         """Connect to database and load AGE."""
         self.conn = psycopg2.connect(self.db_connection)
         self.cursor = self.conn.cursor()
         self.cursor.execute("LOAD 'age';")
         self.cursor.execute('SET search_path = ag_catalog, "$user", public;')
+        if PGVECTOR_AVAILABLE:
+            register_vector(self.conn)
+        self.prepare_statements()
         print("✓ Connected to database, AGE loaded")
 
+    def prepare_statements(self):
+        """
+        Prepare the parameterized Cypher statements used to write the graph.
+
+        AGE only accepts Cypher parameters through a prepared statement, so
+        each write is prepared once per session and executed with an agtype
+        map of rows. Values never need escaping into the query text.
+        """
+        self.cursor.execute(f"""
+        PREPARE create_modules(agtype) AS
+        SELECT * FROM cypher('{self.graph_name}', $$
+            UNWIND $rows AS r
+            CREATE (m:Module {{
+                name: r.name,
+                repo: r.repo,
+                path: r.path,
+                summary: r.summary,
+                entity_count: r.entity_count
+            }})
+            RETURN count(m)
+        $$, $1) as (nodes agtype);
+        """)
+
+        self.cursor.execute(f"""
+        PREPARE create_contains(agtype) AS
+        SELECT * FROM cypher('{self.graph_name}', $$
+            UNWIND $rows AS r
+            MATCH (m:Module {{name: r.module, repo: r.repo}})
+            MATCH (e {{name: r.name, repo: r.repo}})
+            WHERE NOT (m)-[:CONTAINS]->(e)
+            CREATE (m)-[:CONTAINS]->(e)
+            RETURN count(e)
+        $$, $1) as (edges agtype);
+        """)
+
     def close(self):
         """Close database connection."""
         if self.cursor:
@@ -159,56 +392,220 @@ class RaptorSummarizer:
             self.conn.close()
         print("✓ Connection closed")
 
-    # ============= Checkpointing =============
-
-    def load_checkpoint(self) -> Dict[str, Dict]:
-        """Load existing checkpoint data."""
-        if CHECKPOINT_FILE.exists():
-            try:
-                with open(CHECKPOINT_FILE, 'r') as f:
-                    data = json.load(f)
-                print(f"✓ Loaded checkpoint: {len(data)} modules already processed")
-                return data
-            except Exception as e:
-                print(f"⚠ Could not load checkpoint: {e}")
-        return {}
-
-    def save_checkpoint(self, checkpoint_data: Dict[str, Dict]):
-        """Save checkpoint data to file."""
-        try:
-            with open(CHECKPOINT_FILE, 'w') as f:
-                json.dump(checkpoint_data, f, indent=2)
-            print(f"   💾 Checkpoint saved: {len(checkpoint_data)} modules")
-        except Exception as e:
-            print(f"   ⚠ Checkpoint save failed: {e}")
+    # ============= Cache =============
+
+    def open_cache(self, cache_file: Path = CACHE_FILE):
+        """
+        Open the summary/embedding cache, creating it if needed.
+
+        The connection autocommits, so each result is appended to the WAL as
+        soon as it is produced. An interrupted run keeps every summary it
+        paid for, and resuming is just running again.
+        """
+        self.cache = sqlite3.connect(str(cache_file), isolation_level=None, check_same_thread=False)
+        self.cache.execute('PRAGMA journal_mode=WAL')
+        self.cache.execute('PRAGMA synchronous=NORMAL')
+        self.cache.execute("""
+            CREATE TABLE IF NOT EXISTS summary_cache (
+                hash TEXT PRIMARY KEY,
+                summary TEXT,
+                model TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self.cache.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                hash TEXT PRIMARY KEY,
+                embedding BLOB,
+                dim INT
+            )
+        """)
+        self.cache.execute("""
+            CREATE TABLE IF NOT EXISTS semantic_index (
+                hash TEXT PRIMARY KEY,
+                embedding BLOB,
+                scale REAL,
+                summary TEXT,
+                version TEXT,
+                module TEXT
+            )
+        """)
+
+        rows = self.cache.execute(
+            'SELECT embedding, scale, summary, module FROM semantic_index WHERE version = ? AND module IS NOT NULL',
+            (SUMMARY_VERSION,)
+        ).fetchall()
+        if rows:
+            # Only one embedding size can be scored; keep the common one
+            dim, _ = Counter(len(blob) for blob, _, _, _ in rows).most_common(1)[0]
+            rows = [row for row in rows if len(row[0]) == dim]
+        self.semantic_summaries = [summary for _, _, summary, _ in rows]
+        self.semantic_rows = defaultdict(list)
+        for row, (_, _, _, module) in enumerate(rows):
+            self.semantic_rows[module].append(row)
+        if rows:
+            self.semantic_vectors = np.vstack([np.frombuffer(blob, dtype=np.int8) for blob, _, _, _ in rows])
+            self.semantic_scales = np.array([scale for _, scale, _, _ in rows], dtype=np.float32)
+        else:
+            self.semantic_vectors = self.semantic_scales = None
+        self.semantic_count = len(rows)
+        print(f"✓ Opened cache: {cache_file.name} ({len(rows)} semantic entries)")
+
+    def close_cache(self):
+        """Close the summary/embedding cache."""
+        if self.cache:
+            self.cache.close()
+            self.cache = None
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        """Hash text for use as a cache key."""
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def summary_key(self, content: str) -> str:
+        """Hash module content together with the model and prompt that summarize it."""
+        return self.content_hash(f"{SUMMARY_VERSION}\0{content}")
+
+    def lookup_summary(self, content_hash: str) -> Optional[str]:
+        """Return the cached summary for hashed module content, or None."""
+        with self.cache_lock:
+            row = self.cache.execute(
+                'SELECT summary FROM summary_cache WHERE hash = ?', (content_hash,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def store_summary(self, content_hash: str, summary: str):
+        """Cache a summary under the hash of the content it was generated from."""
+        with self.cache_lock:
+            self.cache.execute(
+                'INSERT OR REPLACE INTO summary_cache (hash, summary, model) VALUES (?, ?, ?)',
+                (content_hash, summary, SUMMARY_MODEL)
+            )
 
-    def clear_checkpoint(self):
-        """Remove checkpoint file after successful completion."""
-        if CHECKPOINT_FILE.exists():
-            CHECKPOINT_FILE.unlink()
-            print("✓ Checkpoint cleared")
+    def lookup_embedding(self, summary_hash: str) -> Optional[np.ndarray]:
+        """Return the cached embedding for a hashed summary, or None."""
+        with self.cache_lock:
+            row = self.cache.execute(
+                'SELECT embedding FROM embedding_cache WHERE hash = ?', (summary_hash,)
+            ).fetchone()
+        return np.frombuffer(row[0], dtype=np.float32) if row else None
+
+    def lookup_similar_summaries(self, vectors: List[Optional[np.ndarray]],
+                                 modules: List[str]) -> List[Optional[str]]:
+        """
+        For each unit vector, return the summary of the most similar cached
+        content of the same module if it clears SEMANTIC_THRESHOLD, else None.
+
+        Summaries name their module, repo and path, so one written for
+        another module is never reused. The whole batch is scored with one
+        matrix product, so the cached vectors are read once per batch rather
+        than once per query. Cached vectors are int8, so scores are
+        rescaled by each row's scale.
+        """
+        results: List[Optional[str]] = [None] * len(vectors)
+        if not self.semantic_count:
+            return results
+
+        cached = self.semantic_vectors[:self.semantic_count]
+        queries = [i for i, vector in enumerate(vectors)
+                   if vector is not None and vector.shape[0] == cached.shape[1]
+                   and modules[i] in self.semantic_rows]
+        if not queries:
+            return results
+
+        sims = cached @ np.stack([vectors[i] for i in queries], axis=1)
+        sims *= self.semantic_scales[:self.semantic_count, np.newaxis]
+        for col, i in enumerate(queries):
+            rows = self.semantic_rows[modules[i]]
+            scores = sims[rows, col]
+            best = int(scores.argmax())
+            if scores[best] > SEMANTIC_THRESHOLD:
+                results[i] = self.semantic_summaries[rows[best]]
+        return results
+
+    def store_similar_summary(self, content_hash: str, module: str, vector: np.ndarray, summary: str):
+        """
+        Add normalized content and its summary to the semantic cache, under
+        the module ("repo/path") the summary was written for.
+
+        The vector is scalar-quantized to int8 with one scale per vector,
+        a quarter of the float32 size on disk and in memory. After L2
+        normalization the cosine error this adds is well under 1%.
+
+        A vector of another dimension than the cached ones means the BGE
+        model changed; the old vectors can never match again, so they are
+        dropped and the index starts over.
+        """
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        quantized = np.round(vector / scale).astype(np.int8)
+        with self.cache_lock:
+            if self.semantic_vectors is not None and self.semantic_vectors.shape[1] != vector.shape[0]:
+                self.cache.execute('DELETE FROM semantic_index WHERE length(embedding) != ?', (vector.shape[0],))
+                self.semantic_vectors = self.semantic_scales = None
+                self.semantic_count = 0
+                self.semantic_summaries = []
+                self.semantic_rows = defaultdict(list)
+            self.cache.execute(
+                'INSERT OR REPLACE INTO semantic_index (hash, embedding, scale, summary, version, module) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (content_hash, quantized.tobytes(), scale, summary, SUMMARY_VERSION, module)
+            )
 
-    def escape_cypher(self, s: str) -> str:
-        """Escape string for Cypher query."""
-        if s is None:
-            return ''
-        return s.replace("\\", "\\\\").replace("'", "\\'").replace("\n", " ").replace("\r", "")
+        # Grow the matrix geometrically instead of copying it on every insert
+        if self.semantic_vectors is None:
+            self.semantic_vectors = np.empty((BATCH_SIZE, vector.shape[0]), dtype=np.int8)
+            self.semantic_scales = np.empty(BATCH_SIZE, dtype=np.float32)
+        elif self.semantic_count == len(self.semantic_vectors):
+            grown = np.empty((2 * self.semantic_count, self.semantic_vectors.shape[1]), dtype=np.int8)
+            grown[:self.semantic_count] = self.semantic_vectors
+            self.semantic_vectors = grown
+            self.semantic_scales = np.resize(self.semantic_scales, 2 * self.semantic_count)
+        self.semantic_vectors[self.semantic_count] = quantized
+        self.semantic_scales[self.semantic_count] = scale
+        self.semantic_rows[module].append(self.semantic_count)
+        self.semantic_count += 1
+        self.semantic_summaries.append(summary)
+
+    def embed_for_lookup(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Embed module content prefixes as unit float32 vectors for the semantic cache.
+
+        The header naming the module, repo and path is left out, so
+        similarity reflects the entities alone.
+        """
+        return self.generate_embeddings_batch(
+            [strip_module_header(text)[:SEMANTIC_PREFIX_CHARS] for text in texts]
+        )
+
+    def store_embedding(self, summary_hash: str, embedding: np.ndarray):
+        """Cache an embedding as packed float32."""
+        with self.cache_lock:
+            self.cache.execute(
+                'INSERT OR REPLACE INTO embedding_cache (hash, embedding, dim) VALUES (?, ?, ?)',
+                (summary_hash, embedding.tobytes(), len(embedding))
+            )
 
     # ============= Module Discovery =============
 
+    def iter_entities(self, entities_file: str) -> Iterator[Dict]:
+        """Yield entity dicts from the entities file, streaming when ijson is available."""
+        if IJSON_AVAILABLE:
+            with open(entities_file, 'rb') as f:
+                yield from ijson.items(f, 'all_entities.item', use_float=True)
+        else:
+            with open(entities_file, 'rb') as f:
+                data = orjson.loads(f.read()) if ORJSON_AVAILABLE else json.load(f)
+            yield from data.get('all_entities', [])
+
     def discover_modules_from_entities(self, entities_file: str) -> Dict[str, Module]:
         """Discover modules by analyzing file paths of entities."""
         print(f"\n📁 Discovering modules from {entities_file}...")
 
-        with open(entities_file, 'r') as f:
-            data = json.load(f)
-
-        all_entities = data.get('all_entities', [])
-        print(f"   Loaded {len(all_entities)} entities")
-
         modules: Dict[str, Module] = {}
+        entity_count = 0
 
-        for entity_data in all_entities:
+        for entity_data in self.iter_entities(entities_file):
+            entity_count += 1
             entity = Entity(
                 name=entity_data.get('name', ''),
                 entity_type=entity_data.get('entity_type', 'Unknown'),
@@ -229,20 +626,20 @@ class RaptorSummarizer:
                 # Create module key
                 module_key = f"{repo}/{module_name}"
 
-                if module_key not in modules:
-                    modules[module_key] = Module(
+                module = modules.get(module_key)
+                if module is None:
+                    module = modules[module_key] = Module(
                         name=module_name,
                         repo=repo,
                         path=module_path
                     )
 
-                modules[module_key].entities.append(entity)
+                module.entities.append(entity)
 
                 # Track entity type counts
-                etype = entity.entity_type
-                modules[module_key].entity_types[etype] = \
-                    modules[module_key].entity_types.get(etype, 0) + 1
+                module.entity_types[entity.entity_type] += 1
 
+        print(f"   Loaded {entity_count} entities")
         self.stats['modules_discovered'] = len(modules)
         print(f"   ✓ Discovered {len(modules)} modules")
 
@@ -250,40 +647,7 @@ class RaptorSummarizer:
 
     def _extract_module_info(self, file_path: str) -> Optional[Tuple[str, str, str]]:
         """Extract (repo, module_path, module_name) from file path."""
-        if not file_path:
-            return None
-
-        parts = file_path.split('/')
-        if len(parts) < 2:
-            return None
-
-        repo = parts[0]
-
-        # For regen-ledger, look for x/ modules
-        if repo == 'regen-ledger' and len(parts) >= 3 and parts[1] == 'x':
-            module_name = parts[2]  # e.g., 'ecocredit'
-            module_path = f"x/{module_name}"
-            return (repo, module_path, module_name)
-
-        # For other repos, use top-level directory as module
-        # Common patterns: src/, lib/, packages/, etc.
-        if len(parts) >= 2:
-            # Check for common package structures
-            if parts[1] in ['src', 'lib', 'packages', 'internal', 'pkg']:
-                if len(parts) >= 3:
-                    module_name = parts[2]
-                    module_path = '/'.join(parts[1:3])
-                else:
-                    module_name = parts[1]
-                    module_path = parts[1]
-            else:
-                # Use first directory as module
-                module_name = parts[1]
-                module_path = parts[1]
-
-            return (repo, module_path, module_name)
-
-        return None
+        return module_info(file_path) if file_path else None
 
     def discover_regen_ledger_modules(self, ledger_path: str) -> Dict[str, Module]:
         """Discover modules specifically from regen-ledger x/ directory."""
@@ -313,14 +677,16 @@ class RaptorSummarizer:
 
     # ============= Summary Generation =============
 
-    def generate_summary(self, module: Module) -> Optional[str]:
+    def generate_summary(self, module: Module, content: Optional[str] = None) -> Optional[str]:
         """Generate LLM summary for a module using OpenAI."""
         if not self.openai_api_key:
             print(f"   ⚠ No OpenAI API key, skipping summary for {module.name}")
             return None
 
-        content = module.get_content_for_summary()
+        if content is None:
+            content = module.get_content_for_summary()
 
+        # Cached summaries are keyed on SUMMARY_PROMPT_VERSION; bump it when editing this
         prompt = f"""You are a technical documentation expert analyzing the Regen Network codebase.
 
 Generate a concise 2-3 paragraph summary of the following module. Cover:
@@ -335,17 +701,23 @@ Be specific and technical. Avoid generic statements.
 ---
 Summary:"""
 
+        # Prompt tokens (roughly 4 characters each without a tokenizer), plus the completion budget
+        encoding = summary_encoding()
+        prompt_tokens = len(encoding.encode(prompt)) if encoding else len(prompt) // 4
+        self.request_bucket.acquire(1)
+        self.token_bucket.acquire(prompt_tokens + SUMMARY_MAX_TOKENS)
+
         try:
-            response = requests.post(
+            response = self.session.post(
                 "https://api.openai.com/v1/chat/completions",
                 headers={
                     "Authorization": f"Bearer {self.openai_api_key}",
                     "Content-Type": "application/json"
                 },
                 json={
-                    "model": "gpt-4.1-mini",
+                    "model": SUMMARY_MODEL,
                     "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": 500,
+                    "max_tokens": SUMMARY_MAX_TOKENS,
                     "temperature": 0.3
                 },
                 timeout=30
@@ -370,10 +742,10 @@ Summary:"""
 
     # ============= Embedding Generation =============
 
-    def generate_embedding(self, text: str) -> Optional[List[float]]:
-        """Generate embedding using the BGE server."""
+    def generate_embedding(self, text: str) -> Optional[np.ndarray]:
+        """Generate a unit-length float32 embedding using the BGE server."""
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.bge_url}/encode",
                 json={"text": text},
                 timeout=30
@@ -381,8 +753,8 @@ Summary:"""
 
             if response.status_code == 200:
                 data = response.json()
-                embedding = data.get('embedding', data.get('embeddings', []))
-                if embedding:
+                embedding = normalize_embedding(data.get('embedding', data.get('embeddings', [])))
+                if embedding is not None:
                     self.stats['embeddings_created'] += 1
                     return embedding
             else:
@@ -393,149 +765,291 @@ Summary:"""
 
         return None
 
-    def process_module(self, key: str, module: Module, skip_llm: bool, skip_embed: bool) -> Tuple[str, Optional[str], Optional[List[float]]]:
-        """Process a single module (summary + embedding). Thread-safe for parallel execution."""
-        summary = None
-        embedding = None
+    def generate_embeddings_batch(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Generate unit-length embeddings for many texts, EMBED_BATCH_SIZE per BGE request.
+
+        Falls back to one request per text if the server has no batch route.
+        """
+        results: List[Optional[np.ndarray]] = []
+
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            chunk = texts[start:start + EMBED_BATCH_SIZE]
+            embeddings = None
+
+            if self.bge_batch_supported:
+                try:
+                    response = self.session.post(
+                        f"{self.bge_url}/encode_batch",
+                        json={"texts": chunk},
+                        timeout=60
+                    )
+
+                    if response.status_code == 200:
+                        embeddings = response.json().get('embeddings')
+                    elif response.status_code in (404, 405):
+                        print("   ⚠ BGE server has no /encode_batch route, using /encode")
+                        self.bge_batch_supported = False
+                    else:
+                        print(f"   ⚠ BGE batch error {response.status_code}")
+
+                except Exception as e:
+                    print(f"   ⚠ Batch embedding error: {e}")
+
+            if embeddings and len(embeddings) == len(chunk):
+                self.stats['embeddings_created'] += len(chunk)
+                results.extend(normalize_embedding(embedding) for embedding in embeddings)
+            else:
+                results.extend(self.generate_embedding(text) for text in chunk)
+
+        return results
 
-        # Generate LLM summary
-        if not skip_llm:
-            summary = self.generate_summary(module)
+    def summarize_batch(
+        self,
+        batch: List[Tuple[str, Module]],
+        executor: ThreadPoolExecutor,
+        skip_llm: bool
+    ) -> List[Optional[str]]:
+        """
+        Summarize a batch of modules, reusing cached results.
+
+        Modules with fewer than MIN_ENTITIES entities get a templated
+        summary. Other summaries are looked up by the hash of the module
+        content and SUMMARY_VERSION, so unchanged modules cost nothing and
+        identical content is only sent once. Content that misses the exact
+        cache but embeds close to content previously summarized for the
+        same module reuses that summary. The rest is summarized concurrently.
+        """
+        contents = [module.get_content_for_summary() for _, module in batch]
+        content_hashes = [self.summary_key(content) for content in contents]
+        summaries = []
+        for (_, module), h in zip(batch, content_hashes):
+            if module.entity_count < MIN_ENTITIES:
+                summaries.append(module.get_template_summary())
+                self.stats['summaries_templated'] += 1
+            else:
+                summary = self.lookup_summary(h)
+                summaries.append(summary)
+                self.stats['summaries_cached'] += summary is not None
+
+        # First index of each uncached content hash; duplicates share its result
+        missing = {}
+        for i, summary in enumerate(summaries):
+            if not summary:
+                missing.setdefault(content_hashes[i], i)
+        if missing and not skip_llm:
+            generated = {}
+            lookup_vectors = dict(zip(missing, self.embed_for_lookup(
+                [contents[i] for i in missing.values()]
+            )))
+            similar = self.lookup_similar_summaries(
+                list(lookup_vectors.values()),
+                [module_key(batch[i][1]) for i in missing.values()]
+            )
+            for h, summary in zip(lookup_vectors, similar):
+                if summary:
+                    generated[h] = summary
+                    self.store_summary(h, summary)
+                    self.stats['summaries_reused'] += 1
+
+            to_generate = [(h, i) for h, i in missing.items() if h not in generated]
+            for (h, i), summary in zip(to_generate, executor.map(
+                self.generate_summary,
+                (batch[i][1] for _, i in to_generate),
+                (contents[i] for _, i in to_generate)
+            )):
+                generated[h] = summary
+                if summary:
+                    self.store_summary(h, summary)
+                    if lookup_vectors[h] is not None:
+                        self.store_similar_summary(h, module_key(batch[i][1]), lookup_vectors[h], summary)
+            for i, h in enumerate(content_hashes):
+                if not summaries[i]:
+                    summaries[i] = generated[h]
+
+        return summaries
+
+    def embed_summaries(self, summaries: List[Optional[str]]) -> List[Optional[np.ndarray]]:
+        """
+        Embed a batch of summaries, reusing embeddings cached by summary hash.
+
+        Misses go to the BGE server in one batched call. Runs on its own
+        thread in run(), overlapping the next batch's OpenAI calls.
+        """
+        embeddings: List[Optional[np.ndarray]] = [None] * len(summaries)
+        summary_hashes = {i: self.content_hash(summary) for i, summary in enumerate(summaries) if summary}
+        for i, h in summary_hashes.items():
+            embeddings[i] = self.lookup_embedding(h)
+        self.stats['embeddings_cached'] += sum(1 for embedding in embeddings if embedding is not None)
+
+        missing = {}
+        for i, h in summary_hashes.items():
+            if embeddings[i] is None:
+                missing.setdefault(h, i)
+        if missing:
+            vectors = dict(zip(missing, self.generate_embeddings_batch(
+                [summaries[i] for i in missing.values()]
+            )))
+            for h, vector in vectors.items():
+                if vector is not None:
+                    self.store_embedding(h, vector)
+            for i, h in summary_hashes.items():
+                if embeddings[i] is None:
+                    embeddings[i] = vectors[h]
+
+        return embeddings
+
+    def record_batch(
+        self,
+        modules: Dict[str, Module],
+        batch: List[Tuple[str, Module]],
+        summaries: List[Optional[str]],
+        embeddings: Optional[Future]
+    ):
+        """Attach a finished batch's summaries and embeddings to its modules and log them."""
+        vectors: List[Optional[np.ndarray]] = [None] * len(batch)
+        if embeddings is not None:
+            try:
+                vectors = embeddings.result()
+            except Exception as e:
+                error = f"Embedding error: {e}"
+                self.stats['errors'].append(error)
+                print(f"   ✗ {error}")
 
-        # Generate embedding
-        if not skip_embed and summary:
-            embedding = self.generate_embedding(summary)
+        for (key, _), summary, embedding in zip(batch, summaries, vectors):
+            module = modules[key]
+            module.summary = summary
+            module.embedding = embedding
 
-        return key, summary, embedding
+            # Log result
+            status = []
+            if summary:
+                status.append(f"summary:{len(summary)}ch")
+            if embedding is not None:
+                status.append(f"embed:{len(embedding)}d")
+            print(f"   ✓ {key} ({', '.join(status) if status else 'no data'})")
 
     # ============= Graph Loading =============
 
-    def create_module_node(self, module: Module) -> bool:
-        """Create a Module node in the graph."""
+    def create_module_nodes(self, modules: List[Module]) -> List[Module]:
+        """
+        Create Module nodes in the graph with a single UNWIND statement.
+
+        Returns the modules that were created: all of them, or none if the
+        statement failed and was rolled back.
+        """
+        rows = [{
+            'name': module.name,
+            'repo': module.repo,
+            'path': module.path,
+            'summary': (module.summary or '')[:2000],  # Limit length
+            'entity_count': module.entity_count
+        } for module in modules]
+        if not rows:
+            return []
+
         try:
-            name = self.escape_cypher(module.name)
-            repo = self.escape_cypher(module.repo)
-            path = self.escape_cypher(module.path)
-            summary = self.escape_cypher(module.summary or '')[:2000]  # Limit length
-
-            # Create node
-            query = f"""
-            SELECT * FROM cypher('{self.graph_name}', $$
-                CREATE (m:Module {{
-                    name: '{name}',
-                    repo: '{repo}',
-                    path: '{path}',
-                    summary: '{summary}',
-                    entity_count: {module.entity_count}
-                }})
-                RETURN m
-            $$) as (m agtype);
-            """
-
-            self.cursor.execute(query)
+            self.cursor.execute("EXECUTE create_modules(%s);", (json_dumps({'rows': rows}),))
+            self.stats['nodes_created'] += int(self.cursor.fetchone()[0])
             self.conn.commit()
-            self.stats['nodes_created'] += 1
-            return True
+            return modules
 
         except Exception as e:
-            error = f"Error creating Module node {module.name}: {e}"
+            error = f"Error creating Module nodes: {e}"
             self.stats['errors'].append(error)
             self.conn.rollback()
-            return False
-
-    def create_contains_edges(self, module: Module) -> int:
-        """Create CONTAINS edges from Module to its entities."""
-        edges_created = 0
+            return []
+
+    def create_contains_edges(self, modules: List[Module]) -> int:
+        """
+        Create CONTAINS edges from Modules to their entities in one statement.
+
+        Entities are matched by name and repo, so they must already exist in
+        the graph; names with no matching node are skipped. The whole batch
+        commits or rolls back together.
+        """
+        rows = [
+            {'module': module.name, 'repo': module.repo, 'name': name}
+            for module in modules
+            for name in dict.fromkeys(entity.name for entity in module.entities)
+        ]
+        if not rows:
+            return 0
 
-        # Group entities by type for efficient edge creation
-        for entity in module.entities:
-            try:
-                entity_name = self.escape_cypher(entity.name)
-                module_name = self.escape_cypher(module.name)
-
-                # Match existing entity and create edge
-                # This requires entities to already exist in the graph
-                query = f"""
-                SELECT * FROM cypher('{self.graph_name}', $$
-                    MATCH (m:Module {{name: '{module_name}', repo: '{module.repo}'}})
-                    MATCH (e {{name: '{entity_name}', repo: '{module.repo}'}})
-                    WHERE NOT (m)-[:CONTAINS]->(e)
-                    CREATE (m)-[:CONTAINS]->(e)
-                    RETURN e
-                $$) as (e agtype);
-                """
-
-                self.cursor.execute(query)
-                result = self.cursor.fetchall()
-                if result:
-                    edges_created += 1
-                self.conn.commit()
+        try:
+            # Lets the Module property match use an index instead of a scan per row
+            self.cursor.execute(sql.SQL(
+                "CREATE INDEX IF NOT EXISTS module_properties_idx ON {table} USING gin (properties);"
+            ).format(table=sql.Identifier(self.graph_name, "Module")))
+            self.cursor.execute("EXECUTE create_contains(%s);", (json_dumps({'rows': rows}),))
+            edges_created = int(self.cursor.fetchone()[0])
+            self.conn.commit()
 
-            except Exception as e:
-                # Entity might not exist in graph - that's ok
-                self.conn.rollback()
-                continue
+        except Exception as e:
+            error = f"Error creating CONTAINS edges: {e}"
+            self.stats['errors'].append(error)
+            self.conn.rollback()
+            return 0
 
         self.stats['edges_created'] += edges_created
         return edges_created
 
-    def store_module_embedding(self, module: Module) -> bool:
-        """Store module summary embedding in koi_embeddings."""
-        if not module.embedding or not module.summary:
-            return False
-
-        try:
-            # First, create or get memory entry for the module summary
-            rid = f"module:{module.repo}/{module.name}"
-
-            # Content must be JSONB
-            content_json = json.dumps({
-                'text': module.summary,
-                'type': 'module_summary'
-            })
-
-            metadata_json = json.dumps({
+    def store_module_embeddings(self, modules: List[Module]) -> int:
+        """
+        Store module summaries in koi_memories and their embeddings in
+        koi_embeddings, two multi-row INSERTs and one commit for all modules.
+
+        Returns the number of embeddings stored.
+        """
+        modules = [module for module in modules if module.embedding is not None and module.summary]
+        if not modules:
+            return 0
+
+        # Content and metadata must be JSONB; rid identifies the module summary
+        memories = [(
+            f"module:{module.repo}/{module.name}",
+            'NEW',
+            'raptor_summarizer',
+            Json({'text': module.summary, 'type': 'module_summary'}, dumps=json_dumps),
+            Json({
                 'repo': module.repo,
                 'path': module.path,
                 'entity_count': module.entity_count,
                 'title': f"Module: {module.name}"
-            })
+            }, dumps=json_dumps)
+        ) for module in modules]
 
-            # Insert into koi_memories (content is jsonb, requires event_type and source_sensor)
-            self.cursor.execute("""
+        try:
+            # koi_memories requires event_type and source_sensor
+            returned = execute_values(self.cursor, """
                 INSERT INTO koi_memories (rid, event_type, source_sensor, content, metadata, created_at)
-                VALUES (%s, %s, %s, %s::jsonb, %s::jsonb, NOW())
+                VALUES %s
                 ON CONFLICT (rid) DO UPDATE
                 SET content = EXCLUDED.content, metadata = EXCLUDED.metadata
-                RETURNING id
-            """, (
-                rid,
-                'NEW',
-                'raptor_summarizer',
-                content_json,
-                metadata_json
-            ))
-
-            memory_id = self.cursor.fetchone()[0]
+                RETURNING rid, id
+            """, memories, template="(%s, %s, %s, %s::jsonb, %s::jsonb, NOW())", fetch=True)
+            memory_ids = dict(returned)
 
-            # Insert embedding (1024 dims from BGE/OpenAI text-embedding-3-large)
-            embedding_str = f"[{','.join(str(x) for x in module.embedding)}]"
+            # 1024 dims from BGE/OpenAI text-embedding-3-large
+            embeddings = [(
+                memory_ids[rid],
+                module.embedding if PGVECTOR_AVAILABLE else json_dumps(module.embedding)
+            ) for (rid, *_), module in zip(memories, modules)]
 
-            self.cursor.execute(f"""
+            execute_values(self.cursor, """
                 INSERT INTO koi_embeddings (memory_id, dim_1024)
-                VALUES (%s, %s::vector)
+                VALUES %s
                 ON CONFLICT (memory_id) DO UPDATE
                 SET dim_1024 = EXCLUDED.dim_1024
-            """, (memory_id, embedding_str))
+            """, embeddings, template="(%s, %s::vector)")
 
             self.conn.commit()
-            return True
+            return len(embeddings)
 
         except Exception as e:
-            error = f"Error storing embedding for {module.name}: {e}"
+            error = f"Error storing module embeddings: {e}"
             self.stats['errors'].append(error)
             self.conn.rollback()
-            return False
+            return 0
 
     # ============= Main Pipeline =============
 
@@ -574,99 +1088,59 @@ Summary:"""
             print("\n✓ Dry run complete - no changes made")
             return
 
-        # Connect to database
+        # Connect to database and open the summary/embedding cache
         self.connect()
+        self.open_cache()
 
         try:
-            # Load checkpoint
-            checkpoint = self.load_checkpoint()
-
             # Step 2: Generate summaries and embeddings
             print(f"\n📝 Generating summaries and embeddings ({PARALLEL_WORKERS} parallel workers)...")
-
-            # Separate cached vs to-process modules
-            to_process = {}
-            for key, module in modules.items():
-                if key in checkpoint:
-                    module.summary = checkpoint[key].get('summary')
-                    module.embedding = checkpoint[key].get('embedding')
-                    print(f"   Cached: {key}")
-                else:
-                    to_process[key] = module
-
-            if not to_process:
-                print("   All modules already cached!")
-            else:
-                print(f"\n   Processing {len(to_process)} modules in parallel...")
-                processed_count = 0
-
-                # Process in parallel using ThreadPoolExecutor
-                with ThreadPoolExecutor(max_workers=PARALLEL_WORKERS) as executor:
-                    # Submit all tasks
-                    futures = {
-                        executor.submit(self.process_module, key, module, skip_llm, skip_embed): key
-                        for key, module in to_process.items()
-                    }
-
-                    # Collect results as they complete
-                    for future in as_completed(futures):
-                        key = futures[future]
-                        try:
-                            result_key, summary, embedding = future.result()
-                            module = modules[result_key]
-                            module.summary = summary
-                            module.embedding = embedding
-
-                            # Log result
-                            status = []
-                            if summary:
-                                status.append(f"summary:{len(summary)}ch")
-                            if embedding:
-                                status.append(f"embed:{len(embedding)}d")
-                            print(f"   ✓ {result_key} ({', '.join(status) if status else 'no data'})")
-
-                            # Save to checkpoint
-                            checkpoint[result_key] = {
-                                'summary': summary,
-                                'embedding': embedding
-                            }
-                            processed_count += 1
-
-                            # Checkpoint every N modules
-                            if processed_count % CHECKPOINT_INTERVAL == 0:
-                                self.save_checkpoint(checkpoint)
-
-                        except Exception as e:
-                            print(f"   ✗ {key}: {e}")
-                            self.stats['errors'].append(str(e))
-
-                # Final checkpoint save
-                if processed_count > 0:
-                    self.save_checkpoint(checkpoint)
-                    print(f"\n✓ All summaries/embeddings complete ({len(checkpoint)} total)")
+            print(f"   Processing {len(modules)} modules in batches of {BATCH_SIZE}...")
+            pending = list(modules.items())
+
+            # Summaries run concurrently within a batch. Each batch's embeddings
+            # go out as one request on a separate thread, overlapping the next
+            # batch's summaries, and are collected one batch later.
+            with ThreadPoolExecutor(max_workers=PARALLEL_WORKERS) as executor, \
+                    ThreadPoolExecutor(max_workers=1) as embed_executor:
+                previous = None
+                for start in range(0, len(pending), BATCH_SIZE):
+                    batch = pending[start:start + BATCH_SIZE]
+                    try:
+                        summaries = self.summarize_batch(batch, executor, skip_llm)
+                    except Exception as e:
+                        print(f"   ✗ batch {start // BATCH_SIZE + 1}: {e}")
+                        self.stats['errors'].append(str(e))
+                        continue
+
+                    embeddings = None if skip_embed else embed_executor.submit(self.embed_summaries, summaries)
+                    if previous:
+                        self.record_batch(modules, *previous)
+                    previous = (batch, summaries, embeddings)
+
+                if previous:
+                    self.record_batch(modules, *previous)
+
+            print(f"\n✓ All summaries/embeddings complete "
+                  f"({self.stats['summaries_cached']} summaries, "
+                  f"{self.stats['summaries_reused']} similar summaries, "
+                  f"{self.stats['embeddings_cached']} embeddings from cache)")
 
             # Step 3: Load into graph
             print(f"\n📊 Loading modules into graph...")
 
-            for key, module in modules.items():
-                success = self.create_module_node(module)
-                if success:
-                    print(f"   ✓ Created node: {key}")
-
-                    # Create CONTAINS edges
-                    edges = self.create_contains_edges(module)
-                    if edges > 0:
-                        print(f"      + {edges} CONTAINS edges")
+            created = self.create_module_nodes(list(modules.values()))
+            print(f"   ✓ Created {len(created)} Module nodes")
 
-                    # Store embedding
-                    if module.embedding:
-                        if self.store_module_embedding(module):
-                            print(f"      + Stored embedding")
+            # Create CONTAINS edges and store embeddings for every new module at once
+            edges = self.create_contains_edges(created)
+            print(f"   + {edges} CONTAINS edges")
 
-            # Clear checkpoint on success
-            self.clear_checkpoint()
+            stored = self.store_module_embeddings(created)
+            print(f"   + {stored} embeddings stored")
 
         finally:
+            self.close_cache()
             self.close()
 
         # Print final stats
@@ -678,8 +1152,10 @@ Summary:"""
         print("📊 RAPTOR SUMMARY")
         print("=" * 60)
         print(f"\nModules discovered: {self.stats['modules_discovered']}")
-        print(f"Summaries generated: {self.stats['summaries_generated']}")
-        print(f"Embeddings created: {self.stats['embeddings_created']}")
+        print(f"Summaries generated: {self.stats['summaries_generated']} "
+              f"({self.stats['summaries_cached']} cached, {self.stats['summaries_reused']} reused from similar modules, "
+              f"{self.stats['summaries_templated']} templated)")
+        print(f"Embeddings created: {self.stats['embeddings_created']} ({self.stats['embeddings_cached']} cached)")
         print(f"Graph nodes created: {self.stats['nodes_created']}")
         print(f"Graph edges created: {self.stats['edges_created']}")
 
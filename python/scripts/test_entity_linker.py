@@ -313,6 +313,74 @@ def test_aliases():
     assert all(m.confidence == 0.8 for m in mentions)  # Alias matches
 
 
+def test_same_name_disambiguated_by_context():
+    """Should attribute a shared name to the entity whose module appears nearby"""
+    entities = [
+        Entity("keeper:basket", "Keeper", "Keeper", "basket", []),
+        Entity("keeper:marketplace", "Keeper", "Keeper", "marketplace", []),
+    ]
+    doc = "The sell order logic lives in x/ecocredit/marketplace, see its Keeper."
+    mentions = extract_entity_mentions(doc, entities)
+
+    assert len(mentions) == 1
+    assert mentions[0].entity_id == "keeper:marketplace"
+    # The module travels with the mention so the graph edge hits the same Keeper
+    assert mentions[0].entity_module == "marketplace"
+
+    # Without disambiguation the first entity in the list wins
+    mentions = extract_entity_mentions(doc, entities, config={'disambiguate': False})
+    assert len(mentions) == 1
+    assert mentions[0].entity_id == "keeper:basket"
+
+
+def test_min_confidence_keeps_shorter_form():
+    """Should still match a shorter form at the same start when the longer one is filtered"""
+    entities = [Entity("msg:MsgSell", "Msg", "MsgSell", "marketplace", ["MsgSell handler"])]
+    doc = "The MsgSell handler processes sales."
+
+    # Without filter the alias (0.8) claims the longer span
+    mentions = extract_entity_mentions(doc, entities)
+    assert len(mentions) == 1
+    assert mentions[0].surface_form == "MsgSell handler"
+
+    # Filtering the alias out leaves the exact name match (1.0)
+    mentions = extract_entity_mentions(doc, entities, config={'min_confidence': 0.85})
+    assert len(mentions) == 1
+    assert mentions[0].surface_form == "MsgSell"
+    assert mentions[0].confidence == 1.0
+
+
+def test_alias_prefix_of_module_phrase():
+    """Should keep phase order when one entity's alias is a prefix of another's module phrase"""
+    entities = [
+        Entity("msg:MsgBasket", "Msg", "MsgBasket", "basket", ["Basket"]),
+        Entity("msg:MsgSell", "Msg", "MsgSell", "marketplace", []),
+        Entity("keeper:basket", "Keeper", "Keeper", "basket", []),
+    ]
+    doc = "The basket keeper validates deposits."
+    mentions = extract_entity_mentions(doc, entities)
+
+    # The earlier entity's alias claims "basket"; "keeper" still links by name
+    assert [(m.entity_id, m.surface_form) for m in mentions] == [
+        ("msg:MsgBasket", "basket"),
+        ("keeper:basket", "keeper"),
+    ]
+
+
+def test_overlapping_aliases():
+    """Should find an alias that overlaps the end of a longer, lower-priority one"""
+    entities = [
+        Entity("keeper:ecocredit", "Keeper", "Keeper", "ecocredit", ["credit class"]),
+        Entity("msg:MsgCreateClass", "Msg", "MsgCreateClass", "base", ["create credit"]),
+    ]
+    doc = "Use create credit class to register."
+    mentions = extract_entity_mentions(doc, entities)
+
+    assert len(mentions) == 1
+    assert mentions[0].entity_id == "keeper:ecocredit"
+    assert mentions[0].surface_form == "credit class"
+
+
 if __name__ == "__main__":
     # Run tests with pytest
     pytest.main([__file__, "-v"])
@@ -6,17 +6,53 @@ This script demonstrates using tree-sitter-go to parse Go source files and extra
 structured information about Keepers and Messages for knowledge graph construction.
 """
 
+import hashlib
 import json
 import os
+import re
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional
-from tree_sitter import Language, Parser, Node
+from typing import List, Dict, Optional, Tuple
+from tree_sitter import Language, Parser, Node, Query, QueryCursor
 import tree_sitter_go
 
+# Generated-code boilerplate that is never a docstring
+_SKIP_RE = re.compile(r'compile-time assertion|please upgrade the proto|Reference imports|DO NOT EDIT')
 
-def get_comment_text(node: Node, source_code: bytes) -> Optional[str]:
+# Extracted entities per file, keyed by content hash
+CACHE_FILE = Path(__file__).parent / 'extraction_cache.sqlite'
+# Bump whenever a change to _STRUCT_QUERY or the extraction logic can change
+# what a file extracts to, so entities cached by older code are not reused
+EXTRACTOR_VERSION = 1
+
+# Directories that never contain Keeper or Msg declarations
+SKIP_DIRS = {'node_modules', '.git', 'vendor', 'docs', 'testdata'}
+
+# Grammar is loaded once per process
+GO_LANGUAGE = Language(tree_sitter_go.language())
+
+# Struct declarations at file scope. The walk runs in tree-sitter's C query
+# engine, so Python only touches the declarations that match.
+_STRUCT_QUERY = Query(GO_LANGUAGE, """
+(source_file
+  (type_declaration
+    (type_spec name: (type_identifier) @name type: (struct_type) @struct)) @decl)
+""")
+
+# Per-process Go parser, set up by _init_parser in each worker
+_PARSER: Optional[Parser] = None
+
+
+def _init_parser():
+    """Create this process's Go parser."""
+    global _PARSER
+    _PARSER = Parser(GO_LANGUAGE)
+
+
+def get_comment_text(node: Node) -> Optional[str]:
     """Extract comment text from a comment node."""
-    text = source_code[node.start_byte:node.end_byte].decode('utf-8')
+    text = node.text.decode('utf-8')
 
     # Clean up comment markers
     if text.startswith('//'):
@@ -27,7 +63,7 @@ def get_comment_text(node: Node, source_code: bytes) -> Optional[str]:
     return text if text else None
 
 
-def find_preceding_comment(node: Node, source_code: bytes) -> Optional[str]:
+def find_preceding_comment(node: Node) -> Optional[str]:
     """Find and extract the comment immediately preceding a node."""
     comments = []
     current = node.prev_sibling
@@ -35,30 +71,27 @@ def find_preceding_comment(node: Node, source_code: bytes) -> Optional[str]:
     # Look backwards for comments
     while current:
         if current.type == 'comment':
-            comment_text = get_comment_text(current, source_code)
+            comment_text = get_comment_text(current)
             if comment_text:
                 # Filter out irrelevant comments
-                if not any(skip in comment_text for skip in [
-                    'compile-time assertion',
-                    'please upgrade the proto',
-                    'Reference imports',
-                    'DO NOT EDIT'
-                ]):
-                    comments.insert(0, comment_text)
+                if not _SKIP_RE.search(comment_text):
+                    comments.append(comment_text)
             current = current.prev_sibling
         elif current.type in ['line_comment', 'block_comment']:
-            comment_text = get_comment_text(current, source_code)
+            comment_text = get_comment_text(current)
             if comment_text:
-                comments.insert(0, comment_text)
+                comments.append(comment_text)
             current = current.prev_sibling
         else:
             # Stop at first non-comment
             break
 
+    # Collected walking backwards, so restore source order
+    comments.reverse()
     return ' '.join(comments) if comments else None
 
 
-def extract_struct_fields(struct_node: Node, source_code: bytes) -> List[str]:
+def extract_struct_fields(struct_node: Node) -> List[str]:
     """Extract field names from a struct type."""
     fields = []
 
@@ -70,110 +103,184 @@ def extract_struct_fields(struct_node: Node, source_code: bytes) -> List[str]:
                     # Get field names
                     for subchild in field_decl.children:
                         if subchild.type == 'field_identifier':
-                            field_name = source_code[subchild.start_byte:subchild.end_byte].decode('utf-8')
+                            field_name = subchild.text.decode('utf-8')
                             fields.append(field_name)
 
     return fields
 
 
-def is_keeper_struct(struct_name: str, file_path: str) -> bool:
+def path_flags(file_path: str) -> Tuple[bool, bool]:
+    """Whether a file's location allows Keepers and Msgs respectively."""
+    return 'keeper' in file_path.lower(), 'types' in file_path
+
+
+def is_keeper_struct(struct_name: str, is_keeper_file: bool) -> bool:
     """Determine if a struct is a Keeper based on name and location."""
-    return (
-        struct_name == 'Keeper' and
-        'keeper' in file_path.lower()
-    )
+    return struct_name == 'Keeper' and is_keeper_file
 
 
-def is_msg_struct(struct_name: str, file_path: str) -> bool:
+def is_msg_struct(struct_name: str, is_types_file: bool) -> bool:
     """Determine if a struct is a Msg based on name pattern."""
     return (
+        is_types_file and
         struct_name.startswith('Msg') and
-        not struct_name.endswith('Response') and
-        'types' in file_path
+        not struct_name.endswith('Response')
     )
 
 
-def extract_entities_from_file(file_path: str, parser: Parser) -> List[Dict]:
-    """Extract Keeper and Msg entities from a single Go file."""
+def extract_entities_from_file(file_path: str, source: Optional[bytes] = None) -> List[Dict]:
+    """Extract Keeper and Msg entities from a single Go file, or from its already-read source."""
+    if _PARSER is None:
+        _init_parser()
+
     entities = []
 
-    with open(file_path, 'rb') as f:
-        source_code = f.read()
-
-    tree = parser.parse(source_code)
-    root = tree.root_node
-
-    # Find type declarations
-    def visit_node(node: Node):
-        if node.type == 'type_declaration':
-            # Look for type_spec children
-            for child in node.children:
-                if child.type == 'type_spec':
-                    # Get the type name
-                    type_name = None
-                    struct_type = None
-
-                    for spec_child in child.children:
-                        if spec_child.type == 'type_identifier':
-                            type_name = source_code[spec_child.start_byte:spec_child.end_byte].decode('utf-8')
-                        elif spec_child.type == 'struct_type':
-                            struct_type = spec_child
-
-                    if type_name and struct_type:
-                        # Check if it's a Keeper or Msg
-                        entity_type = None
-                        if is_keeper_struct(type_name, file_path):
-                            entity_type = 'Keeper'
-                        elif is_msg_struct(type_name, file_path):
-                            entity_type = 'Msg'
-
-                        if entity_type:
-                            # Extract docstring
-                            docstring = find_preceding_comment(node, source_code)
-
-                            # Extract fields
-                            fields = extract_struct_fields(struct_type, source_code)
-
-                            # Get line number (1-indexed)
-                            line_number = node.start_point[0] + 1
-
-                            entity = {
-                                'entity_type': entity_type,
-                                'name': type_name,
-                                'file_path': file_path,
-                                'line_number': line_number,
-                                'docstring': docstring,
-                                'fields': fields
-                            }
-
-                            entities.append(entity)
-
-        # Recursively visit children
-        for child in node.children:
-            visit_node(child)
-
-    visit_node(root)
-    return entities
+    if source is None:
+        source = Path(file_path).read_bytes()
+    tree = _PARSER.parse(source)
+    is_keeper_file, is_types_file = path_flags(file_path)
+
+    matches = [{name: nodes[0] for name, nodes in captures.items()}
+               for _, captures in QueryCursor(_STRUCT_QUERY).matches(tree.root_node)]
+    matches.sort(key=lambda match: match['name'].start_byte)
+
+    for match in matches:
+        node = match['decl']
+        type_name = match['name'].text.decode('utf-8')
+
+        # Check if it's a Keeper or Msg
+        entity_type = None
+        if is_keeper_struct(type_name, is_keeper_file):
+            entity_type = 'Keeper'
+        elif is_msg_struct(type_name, is_types_file):
+            entity_type = 'Msg'
 
+        if entity_type:
+            # Extract docstring
+            docstring = find_preceding_comment(node)
 
-def extract_entities_from_directory(directory: str) -> List[Dict]:
-    """Extract entities from all Go files in a directory tree."""
-    # Initialize parser
-    GO_LANGUAGE = Language(tree_sitter_go.language())
-    parser = Parser(GO_LANGUAGE)
+            # Extract fields
+            fields = extract_struct_fields(match['struct'])
+
+            # Get line number (1-indexed)
+            line_number = node.start_point[0] + 1
+
+            entity = {
+                'entity_type': entity_type,
+                'name': type_name,
+                'file_path': file_path,
+                'line_number': line_number,
+                'docstring': docstring,
+                'fields': fields
+            }
+
+            entities.append(entity)
+
+    return entities
 
-    all_entities = []
 
-    # Walk directory tree
+def content_sha(source: bytes) -> bytes:
+    """Cache key for a file: the SHA-256 of EXTRACTOR_VERSION and its contents."""
+    digest = hashlib.sha256(b'v%d\0' % EXTRACTOR_VERSION)
+    digest.update(source)
+    return digest.digest()
+
+
+def _extract_or_report(file_path: str, cached_sha: Optional[bytes]) -> Tuple[Optional[bytes], Optional[List[Dict]]]:
+    """
+    Hash and, if it changed, extract one file inside a worker.
+
+    The file is read once; the sha returned is of the same bytes that were
+    parsed. Errors are reported instead of raised.
+
+    Returns:
+        (sha, entities): entities is None when sha equals cached_sha (the
+        cached entities still apply); both are None when the file failed
+    """
+    try:
+        source = Path(file_path).read_bytes()
+        sha = content_sha(source)
+        if sha == cached_sha:
+            return sha, None
+        return sha, extract_entities_from_file(file_path, source)
+    except Exception as e:
+        print(f"Error processing {file_path}: {e}")
+        return None, None
+
+
+def open_cache(cache_file: Path = CACHE_FILE) -> sqlite3.Connection:
+    """Open the extraction cache, creating it if needed."""
+    cache = sqlite3.connect(str(cache_file), isolation_level=None)
+    cache.execute('PRAGMA journal_mode=WAL')
+    cache.execute('PRAGMA synchronous=NORMAL')
+    cache.execute("""
+        CREATE TABLE IF NOT EXISTS extracted (
+            path TEXT PRIMARY KEY,
+            sha BLOB NOT NULL,
+            entities TEXT NOT NULL
+        )
+    """)
+    return cache
+
+
+def extract_entities_from_directory(directory: str, cache_file: Path = CACHE_FILE) -> Dict[str, List[Dict]]:
+    """
+    Extract entities from all Go files in a directory tree, grouped as keepers and msgs.
+
+    Results are cached per file under the SHA-256 of its contents and
+    EXTRACTOR_VERSION, so re-runs only parse files that changed since the
+    last extraction (or all of them after the extractor changes).
+    """
+    # Collect Go sources first so parsing can be spread across cores
+    file_paths = []
     for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
         for file in files:
             if file.endswith('.go') and not file.endswith('_test.go'):
                 file_path = os.path.join(root, file)
-                try:
-                    entities = extract_entities_from_file(file_path, parser)
-                    all_entities.extend(entities)
-                except Exception as e:
-                    print(f"Error processing {file_path}: {e}")
+                # Keepers and Msgs only live under keeper/ or types/ paths
+                if any(path_flags(file_path)):
+                    file_paths.append(file_path)
+
+    cache = open_cache(cache_file)
+    try:
+        # Workers hash each file as they read it to parse, and skip the
+        # parse when it matches the sha cached for its path
+        cached_shas = dict(cache.execute("SELECT path, sha FROM extracted"))
+        with ProcessPoolExecutor(initializer=_init_parser) as executor:
+            results = list(executor.map(
+                _extract_or_report, file_paths, [cached_shas.get(path) for path in file_paths], chunksize=32
+            ))
+
+        per_file = {}
+        parsed = cached = 0
+        cache.execute("BEGIN")
+        for file_path, (sha, entities) in zip(file_paths, results):
+            if sha is None:
+                # Files that failed to parse are retried next run
+                per_file[file_path] = []
+            elif entities is None:
+                # Unchanged since the last extraction
+                cached += 1
+                row = cache.execute("SELECT entities FROM extracted WHERE path = ?", (file_path,)).fetchone()
+                per_file[file_path] = json.loads(row[0])
+            else:
+                parsed += 1
+                per_file[file_path] = entities
+                cache.execute(
+                    "INSERT OR REPLACE INTO extracted (path, sha, entities) VALUES (?, ?, ?)",
+                    (file_path, sha, json.dumps(entities))
+                )
+        cache.execute("COMMIT")
+        print(f"Parsed {parsed} changed files ({cached} cached)")
+    finally:
+        cache.close()
+
+    all_entities = {'keepers': [], 'msgs': []}
+    for file_path in file_paths:
+        for entity in per_file[file_path]:
+            key = 'keepers' if entity['entity_type'] == 'Keeper' else 'msgs'
+            all_entities[key].append(entity)
 
     return all_entities
 
@@ -194,8 +301,8 @@ def main():
     entities = extract_entities_from_directory(str(ecocredit_dir))
 
     # Print summary
-    keepers = [e for e in entities if e['entity_type'] == 'Keeper']
-    msgs = [e for e in entities if e['entity_type'] == 'Msg']
+    keepers = entities['keepers']
+    msgs = entities['msgs']
 
     print(f"\nFound {len(keepers)} Keepers and {len(msgs)} Msgs")
     print(f"\nKeepers:")
@@ -211,12 +318,13 @@ def main():
     with open(output_file, 'w') as f:
         json.dump(entities, f, indent=2)
 
-    print(f"\n✓ Saved {len(entities)} entities to {output_file}")
+    print(f"\n✓ Saved {len(keepers) + len(msgs)} entities to {output_file}")
 
     # Print a sample entity
-    if entities:
+    sample = keepers[:1] or msgs[:1]
+    if sample:
         print("\n=== Sample Entity ===")
-        print(json.dumps(entities[0], indent=2))
+        print(json.dumps(sample[0], indent=2))
 
 
 if __name__ == '__main__':